@@ -0,0 +1,280 @@
+"""
+常驻分析服务：NudeNet 模型和 PyAV / OpenCV 只在启动时加载一次，之后的任务直接复用
+每次单独运行 nsfw_detect_nudenet.py / moderate_video.py 都要付 Python 启动 + 导入 nudenet + 加载 ONNX 模型的开销，
+大量短任务时这部分比检测本身还慢。服务监听本机 HTTP（Windows 上也能用，不依赖 Unix socket），
+结果按 JSON Lines 边算边返回；同一个文件里的客户端子命令只用标准库，启动几乎没有开销。
+
+用法:
+    python analysis_server.py serve                      # 启动服务（前台运行）
+    python analysis_server.py scan <截图目录>             # 扫描目录里的图片（同 nsfw_detect_nudenet.py）
+    python analysis_server.py moderate <视频或直链>       # 场景截图 + 检测（同 moderate_video.py）
+    python analysis_server.py verdict <视频或直链>        # 只要结论，高风险即停（同 moderate_video.py --verdict）
+客户端加 --json 直接输出原始 JSON Lines。
+
+接口（POST，请求体为 JSON，响应为 application/x-ndjson）：
+  /scan      {"dir": 目录, "batch_size": 8, "no_cache": false}
+  /moderate  {"path": 视频, "threshold", "interval", "save", "output", "verify", "max_width"}
+  /verdict   {"path": 视频, "threshold", "interval", "stop_after", "spread", "output"}
+每一行是一个 {"type": "image" | "frame" | "done" | "error", ...} 对象；GET /health 返回服务状态。
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ── 配置 ──────────────────────────────────────────────────────────────────────
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8770
+# ─────────────────────────────────────────────────────────────────────────────
+
+LEVEL_DISPLAY = {"HIGH": "⚠ 高风险", "MEDIUM": "△ 中风险", "ERROR": "[错误]"}
+
+
+# ── 服务端 ────────────────────────────────────────────────────────────────────
+
+class _Warm:
+    """服务进程里常驻的模型和模块，serve() 启动时填充"""
+    detector = None
+    nsfw = None
+    moderate = None
+    started = 0.0
+    jobs = 0
+    lock = threading.Lock()
+
+
+def _job_scan(job: dict, emit) -> dict:
+    nsfw = _Warm.nsfw
+    input_dir = job["dir"]
+    if not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"目录不存在：{input_dir}")
+    images = sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if os.path.splitext(name)[1].lower() in nsfw.IMAGE_EXTENSIONS
+    )
+    opts = {"batch_size": max(int(job.get("batch_size", nsfw.BATCH_SIZE)), 1), "workers": 0,
+            "detector": _Warm.detector}
+    cache = None if job.get("no_cache") else nsfw.DetectionCache()
+    try:
+        results = (nsfw.detect_images_parallel(images, **opts) if cache is None
+                   else nsfw.detect_images_cached(images, cache, **opts))
+        stats = {"images": len(images), "HIGH": 0, "MEDIUM": 0, "SAFE": 0, "ERROR": 0}
+        for path, detections in results:
+            if isinstance(detections, Exception):
+                level, hits, detections = "ERROR", [str(detections)], []
+            else:
+                level, hits = nsfw.classify_result(detections)
+            stats[level] += 1
+            emit({"type": "image", "name": os.path.basename(path), "level": level,
+                  "hits": hits, "detections": detections})
+    finally:
+        if cache is not None:
+            cache.close()
+    return stats
+
+
+def _job_moderate(job: dict, emit) -> dict:
+    mv = _Warm.moderate
+    return mv.moderate_video(
+        job["path"], job.get("output", mv.OUTPUT_DIR),
+        float(job.get("threshold", mv.SIZE_RATIO_THRESHOLD)), float(job.get("interval", mv.MIN_INTERVAL_SEC)),
+        save=job.get("save", "flagged"), verify=bool(job.get("verify")), max_width=job.get("max_width"),
+        detector=_Warm.detector, on_frame=lambda r: emit({"type": "frame", **r}),
+    )
+
+
+def _job_verdict(job: dict, emit) -> dict:
+    mv = _Warm.moderate
+    spread = int(job.get("spread", mv.VERDICT_SPREAD))
+    if spread < 1:
+        raise ValueError(f"spread 至少为 1：{spread}")
+    return mv.verdict_video(
+        job["path"], float(job.get("threshold", mv.SIZE_RATIO_THRESHOLD)),
+        float(job.get("interval", mv.MIN_INTERVAL_SEC)),
+        stop_after=max(int(job.get("stop_after", mv.STOP_AFTER_HIGH)), 1),
+        spread=spread, output_dir=job.get("output"),
+        detector=_Warm.detector, on_frame=lambda r: emit({"type": "frame", **r}),
+    )
+
+
+_JOBS = {"/scan": _job_scan, "/moderate": _job_moderate, "/verdict": _job_verdict}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.0：响应不带 Content-Length，逐行写完后关闭连接，客户端读到 EOF 即结束
+    protocol_version = "HTTP/1.0"
+
+    def _start(self, status: int = 200) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+
+    def _emit(self, obj: dict) -> None:
+        self.wfile.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self.send_error(404)
+            return
+        self._start()
+        self._emit({"type": "health", "pid": os.getpid(), "uptime": round(time.time() - _Warm.started, 1),
+                    "jobs": _Warm.jobs})
+
+    def do_POST(self) -> None:
+        handler = _JOBS.get(self.path)
+        if handler is None:
+            self.send_error(404)
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self.send_error(400, "请求体不是合法 JSON")
+            return
+
+        with _Warm.lock:
+            _Warm.jobs += 1
+        print(f"[任务] {self.path} {json.dumps(job, ensure_ascii=False)}")
+        self._start()
+        t0 = time.perf_counter()
+        try:
+            stats = handler(job, self._emit)
+            self._emit({"type": "done", **stats, "seconds": round(time.perf_counter() - t0, 3)})
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"[任务] {self.path} 客户端已断开，任务中止")
+        except Exception as e:
+            self._emit({"type": "error", "message": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args) -> None:   # 默认的访问日志太吵，任务日志已在 do_POST 里打印
+        pass
+
+
+def serve(host: str, port: int, onnx_threads: int) -> None:
+    t0 = time.perf_counter()
+    print("加载模型和解码库...")
+    import moderate_video
+    import nsfw_detect_nudenet
+
+    _Warm.nsfw = nsfw_detect_nudenet
+    _Warm.moderate = moderate_video
+    _Warm.detector = nsfw_detect_nudenet.create_detector(onnx_threads)
+    _Warm.started = time.time()
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    print(f"就绪（加载耗时 {time.perf_counter() - t0:.1f}s），监听 http://{host}:{port}  Ctrl+C 退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ── 客户端 ────────────────────────────────────────────────────────────────────
+
+def request_lines(url: str, job: dict | None = None):
+    """发请求并逐行产出服务端返回的 JSON 对象；job 为 None 时发 GET"""
+    data = None if job is None else json.dumps(job, ensure_ascii=False).encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        for line in resp:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _print_line(obj: dict) -> None:
+    kind = obj["type"]
+    if kind in ("image", "frame"):
+        if obj["level"] == "SAFE":
+            return
+        where = obj["name"] if kind == "image" else f"{obj['time']:.2f}s"
+        print(f"{where:<40} {LEVEL_DISPLAY.get(obj['level'], obj['level']):<10} {', '.join(obj['hits'])}")
+    elif kind == "done":
+        detail = {k: v for k, v in obj.items() if k not in ("type", "flagged", "video")}
+        print("\n" + "=" * 70)
+        print("完成：" + "  ".join(f"{k}={v}" for k, v in detail.items()))
+    elif kind == "error":
+        print(f"[错误] {obj['message']}")
+    else:
+        print(json.dumps(obj, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻分析服务（模型常驻内存）及其轻量客户端")
+    parser.add_argument("--host", default=SERVER_HOST, help=f"服务地址，默认 {SERVER_HOST}")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help=f"服务端口，默认 {SERVER_PORT}")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="启动服务")
+    p.add_argument("--threads", type=int, default=0, help="ONNX Runtime 算子内线程数，默认 0 = 自动")
+
+    sub.add_parser("health", help="查看服务状态")
+
+    p = sub.add_parser("scan", help="扫描截图目录")
+    p.add_argument("dir")
+    p.add_argument("--batch-size", type=int, default=8)
+    p.add_argument("--no-cache", action="store_true", help="不使用检测结果缓存")
+
+    for name in ("moderate", "verdict"):
+        p = sub.add_parser(name, help="视频审核" if name == "moderate" else "视频结论（高风险即停）")
+        p.add_argument("path")
+        p.add_argument("--threshold", type=float, default=None)
+        p.add_argument("--interval", type=float, default=None)
+        p.add_argument("--output", default=None, help="需要保存图片时的输出目录")
+        if name == "moderate":
+            p.add_argument("--save", choices=["none", "flagged", "all"], default="flagged")
+            p.add_argument("--verify", action="store_true")
+            p.add_argument("--max-width", type=int, default=None)
+        else:
+            p.add_argument("--stop-after", type=int, default=None)
+            p.add_argument("--spread", type=int, default=None)
+
+    for p in sub.choices.values():
+        p.add_argument("--json", action="store_true", help="直接输出服务端返回的 JSON Lines")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.threads)
+        return
+
+    base = f"http://{args.host}:{args.port}"
+    if args.command == "health":
+        url, job = base + "/health", None
+    elif args.command == "scan":
+        url, job = base + "/scan", {"dir": os.path.abspath(args.dir), "batch_size": args.batch_size,
+                                    "no_cache": args.no_cache}
+    else:
+        path = args.path if args.path.lower().startswith(("http://", "https://")) else os.path.abspath(args.path)
+        job = {"path": path}
+        for key in ("threshold", "interval", "output", "save", "verify", "max_width", "stop_after", "spread"):
+            value = getattr(args, key, None)
+            if value not in (None, False):
+                job[key] = os.path.abspath(value) if key == "output" else value
+        url = f"{base}/{args.command}"
+
+    verdict = None
+    try:
+        for obj in request_lines(url, job):
+            if args.json:
+                print(json.dumps(obj, ensure_ascii=False))
+            else:
+                _print_line(obj)
+            if obj["type"] == "done":
+                verdict = obj.get("verdict")
+            elif obj["type"] == "error":
+                sys.exit(1)
+    except urllib.error.URLError as e:
+        print(f"连接服务失败（{base}）：{e.reason}；先运行 python analysis_server.py serve")
+        sys.exit(1)
+    if verdict == "HIGH":
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+H.264 / HEVC 码流级帧类型识别：只解析包里 NAL 单元头和 slice header 的 slice_type，不解码
+  H.264  nal_unit_type 1 / 5 为图像 slice，slice header 开头是 first_mb_in_slice、slice_type（均为 ue(v)）
+  HEVC   nal_unit_type 0~31 为图像 slice，slice_type 前面有几个依赖 PPS 的字段，
+         PPS 从 extradata（hvcC）或码流内的 PPS NAL 中取
+
+包格式两种都支持：MP4 / MKV 里的长度前缀（avcC / hvcC），以及 TS / 裸流里的 Annex B 起始码。
+一帧多个 slice 时取第一个 slice 的类型，与 FFmpeg 给帧标的 pict_type 一致。
+"""
+
+import re
+
+# 解析 slice header 只需要开头几十个字节
+_HEADER_BYTES = 64
+
+# 防竞争字节：00 00 03 后面跟 00~03 时，03 是插入的，需要去掉
+_EMULATION = re.compile(b"\x00\x00\x03(?=[\x00-\x03])")
+_START_CODE = re.compile(b"\x00\x00\x01")
+
+_H264_SLICE_TYPES = {0: "P", 1: "B", 2: "I", 3: "SP", 4: "SI"}
+_HEVC_SLICE_TYPES = {0: "B", 1: "P", 2: "I"}
+
+SUPPORTED_CODECS = {"h264", "hevc"}
+
+
+class _BitReader:
+    """大端位读取，够解析 slice header 开头几个字段即可"""
+
+    def __init__(self, data: bytes):
+        self.value = int.from_bytes(data, "big")
+        self.bits = len(data) * 8
+        self.pos = 0
+
+    def u(self, n: int) -> int:
+        if self.pos + n > self.bits:
+            raise ValueError("slice header 截断")
+        self.pos += n
+        return (self.value >> (self.bits - self.pos)) & ((1 << n) - 1)
+
+    def ue(self) -> int:
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("ue(v) 非法")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+
+def _rbsp(nal: bytes) -> bytes:
+    """取 NAL 开头一段并去掉防竞争字节"""
+    return _EMULATION.sub(b"\x00\x00", nal[:_HEADER_BYTES])
+
+
+class SliceTypeParser:
+    """
+    按包解析帧类型：parser(packet_bytes) → "I" / "P" / "B" / ...，包里没有图像 slice 时返回 None
+    length_size 为 0 表示 Annex B 起始码格式
+    """
+
+    def __init__(self, codec: str, extradata: bytes | None):
+        self.codec = codec
+        self.length_size = 0
+        self.pps = {}                              # HEVC：pps_id → num_extra_slice_header_bits
+        extradata = extradata or b""
+        if extradata[:1] == b"\x01":
+            if codec == "h264" and len(extradata) >= 7:
+                self.length_size = (extradata[4] & 3) + 1
+            elif codec == "hevc" and len(extradata) >= 23:
+                self.length_size = (extradata[21] & 3) + 1
+                for nal in self._hvcc_nals(extradata):
+                    self._scan_nal(nal)
+        else:
+            for nal in self._split(extradata, 0):
+                self._scan_nal(nal)
+
+    @staticmethod
+    def _hvcc_nals(extradata: bytes):
+        pos, count = 23, extradata[22]
+        for _ in range(count):
+            n = int.from_bytes(extradata[pos + 1:pos + 3], "big")
+            pos += 3
+            for _ in range(n):
+                size = int.from_bytes(extradata[pos:pos + 2], "big")
+                yield extradata[pos + 2:pos + 2 + size]
+                pos += 2 + size
+
+    @staticmethod
+    def _split(data: bytes, length_size: int):
+        """把一个包拆成 NAL 单元"""
+        if length_size:
+            pos = 0
+            while pos + length_size <= len(data):
+                size = int.from_bytes(data[pos:pos + length_size], "big")
+                pos += length_size
+                yield data[pos:pos + size]
+                pos += size
+        else:
+            starts = [m.end() for m in _START_CODE.finditer(data)]
+            for i, start in enumerate(starts):
+                end = starts[i + 1] - 3 if i + 1 < len(starts) else len(data)
+                yield data[start:end]
+
+    def _scan_nal(self, nal: bytes) -> str | None:
+        """处理一个 NAL：参数集记下来，图像 slice 返回其类型"""
+        if not nal:
+            return None
+        if self.codec == "h264":
+            nal_type = nal[0] & 0x1F
+            if nal_type not in (1, 5):
+                return None
+            r = _BitReader(_rbsp(nal[1:]))
+            r.ue()                                 # first_mb_in_slice
+            return _H264_SLICE_TYPES.get(r.ue() % 5)
+
+        nal_type = (nal[0] >> 1) & 0x3F
+        if nal_type == 34:                         # PPS
+            r = _BitReader(_rbsp(nal[2:]))
+            pps_id = r.ue()
+            r.ue()                                 # pps_seq_parameter_set_id
+            r.u(2)                                 # dependent_slice_segments_enabled_flag、output_flag_present_flag
+            self.pps[pps_id] = r.u(3)
+            return None
+        if nal_type > 31:
+            return None
+        r = _BitReader(_rbsp(nal[2:]))
+        if not r.u(1):                             # 不是图像的第一个 slice segment，类型看第一个即可
+            return None
+        if 16 <= nal_type <= 23:
+            r.u(1)                                 # no_output_of_prior_pics_flag
+        pps_id = r.ue()
+        if pps_id not in self.pps:
+            raise ValueError(f"缺少 PPS {pps_id}")
+        r.u(self.pps[pps_id])                      # slice_reserved_flag × num_extra_slice_header_bits
+        return _HEVC_SLICE_TYPES.get(r.ue())
+
+    def __call__(self, data: bytes) -> str | None:
+        for nal in self._split(data, self.length_size):
+            pict_type = self._scan_nal(nal)
+            if pict_type is not None:
+                return pict_type
+        return None
+
+
+def make_slice_type_parser(stream) -> SliceTypeParser | None:
+    """按视频流的编码格式创建解析器；不支持的编码返回 None，由调用方回退到解码"""
+    codec = stream.codec_context.name
+    if codec not in SUPPORTED_CODECS:
+        return None
+    return SliceTypeParser(codec, stream.codec_context.extradata)
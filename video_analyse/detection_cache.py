@@ -0,0 +1,71 @@
+"""
+NudeNet 检测结果缓存
+按图片内容哈希 + 模型版本保存原始检测结果（类别 / 置信度 / 框），同一张图再次扫描时直接取出，不再推理。
+风险等级由 classify_result 从原始结果现算，所以调整阈值不需要重新推理，阈值也不参与缓存键。
+
+缓存是一个 SQLite 文件（默认 temp/detection_cache.sqlite），表结构：
+  detections(hash, model, result, created)   主键 (hash, model)，result 为 JSON
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# ── 配置 ──────────────────────────────────────────────────────────────────────
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp", "detection_cache.sqlite")
+
+# 一条 SQL 里最多带多少个参数（SQLite 默认上限 999）
+_QUERY_CHUNK = 500
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def content_hash(data: bytes) -> str:
+    """图片内容哈希（BLAKE2b-128），文件改名 / 移动后仍能命中"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(path) -> str:
+    with open(path, "rb") as f:
+        return content_hash(f.read())
+
+
+class DetectionCache:
+    """SQLite 检测结果缓存；只在创建它的线程里使用"""
+
+    def __init__(self, path: str = CACHE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS detections ("
+            " hash TEXT NOT NULL, model TEXT NOT NULL, result TEXT NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (hash, model))"
+        )
+
+    def get_many(self, hashes: list[str], model: str) -> dict[str, list]:
+        """批量查询，返回 {哈希: 检测结果}，没命中的不在结果里"""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), _QUERY_CHUNK):
+            part = unique[i:i + _QUERY_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT hash, result FROM detections WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                [model, *part],
+            )
+            for h, result in rows:
+                found[h] = json.loads(result)
+        return found
+
+    def put_many(self, items: list[tuple[str, list]], model: str) -> None:
+        """写入 [(哈希, 检测结果)]，同键覆盖"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO detections (hash, model, result, created) VALUES (?, ?, ?, ?)",
+                [(h, model, json.dumps(detections, ensure_ascii=False), now) for h, detections in items],
+            )
+
+    def close(self) -> None:
+        self.conn.close()
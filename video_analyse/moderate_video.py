@@ -0,0 +1,361 @@
+"""
+视频审核一体化流程：场景切换检测 → 截图 → NudeNet 检测，全程在内存里传帧
+原来的做法是 scene_detect.py 把截图编码成 JPEG 写进 OUTPUT_DIR，nsfw_detect_nudenet.py 再从目录读回解码，
+每帧都要多一次有损编码、写盘、读盘、解码。这里解码出的帧直接转成数组送进模型：
+  - 第一遍与 scene_detect 相同：压缩域粗筛候选帧（可用包索引缓存）
+  - 第二遍顺序解码候选帧（iter_frames_sequential），线程池并行做 缩放转换 + 模型预处理
+  - 攒够一批送进 ONNX 会话，按 classify_result 定级
+  - 只有 --save flagged（默认，仅保存中 / 高风险帧）或 --save all 时才写图片
+
+--verdict：上传把关用，只要一个结论。候选帧按优先级排序——先在时间轴上均匀取 VERDICT_SPREAD 帧，
+再不断取最大空档的中点（二分补点）——逐批 seek 解码检测，高风险命中达到 --stop-after 张立即停止，
+并报告实际分类了多少帧。结论为 HIGH 时退出码为 2。
+
+用法:
+    python moderate_video.py --path <视频文件或直链> [--verify] [--save none|flagged|all]
+    python moderate_video.py --path <视频文件或直链> --verdict [--stop-after 1]
+"""
+
+import argparse
+import heapq
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from nsfw_detect_nudenet import (BATCH_SIZE, ONNX_THREADS, PREPROCESS_THREADS, classify_result,
+                                 create_detector, detect_preprocessed, preprocess)
+from remote_source import is_url, resolve_url
+from scene_detect import (MIN_INTERVAL_SEC, OUTPUT_DIR, SIZE_RATIO_THRESHOLD, _write_capture,
+                          collect_candidate_pts, decode_frame_by_seek, frame_to_image,
+                          is_real_cut, iter_frames_sequential)
+
+# ── 配置 ──────────────────────────────────────────────────────────────────────
+# --verdict：第一轮在时间轴上均匀取多少帧
+VERDICT_SPREAD = 8
+
+# --verdict：高风险命中达到多少帧即停止
+STOP_AFTER_HIGH = 1
+# ─────────────────────────────────────────────────────────────────────────────
+
+LEVEL_DISPLAY = {"HIGH": "⚠ 高风险", "MEDIUM": "△ 中风险", "SAFE": "安全"}
+LEVEL_RANK = {"SAFE": 0, "MEDIUM": 1, "HIGH": 2}
+
+
+def _prepare(frame, max_width: int | None):
+    """解码帧 → BGR 数组 → 模型输入；在线程池里执行"""
+    img = frame if isinstance(frame, np.ndarray) else frame_to_image(frame, max_width)
+    return img, preprocess(img)
+
+
+def iter_candidate_frames(video_path: str, candidates: list[dict], verify: bool = False,
+                          max_width: int | None = None, threads: int = 1):
+    """
+    按时间顺序产出 (候选, 帧, 帧时间)；帧是 av.VideoFrame 或（seek 兜底时）BGR 数组
+    verify=True 时跳过像素域校验未通过的候选帧
+    """
+    frames = iter_frames_sequential(video_path, candidates, threads=threads, probe=verify)
+    for c, frame, actual_time, thumbs in frames:
+        if verify and not is_real_cut(thumbs):
+            continue
+        if frame is None:
+            frame, actual_time = decode_frame_by_seek(video_path, c["time"], max_width, threads)
+            if frame is None:
+                print(f"  [跳过] {c['time']:.2f}s 解码失败")
+                continue
+        yield c, frame, actual_time
+
+
+def classify_frames(frames, detector, batch_size: int = BATCH_SIZE, prep_threads: int = PREPROCESS_THREADS,
+                    max_width: int | None = None):
+    """
+    frames 为 (候选, 帧, 帧时间) 的迭代器；按批推理，按输入顺序产出
+    (候选, BGR 数组, 帧时间, 风险等级, 触发项, 原始检测结果)
+    预处理失败或整批推理失败时等级为 "ERROR"，触发项为错误信息
+    """
+    def run(batch):
+        prepared = []
+        for c, actual_time, future in batch:
+            try:
+                prepared.append((c, actual_time, *future.result()))
+            except Exception as e:
+                prepared.append((c, actual_time, None, e))
+        ok = [(img, item) for _, _, img, item in prepared if img is not None]
+        try:
+            results = iter(detect_preprocessed(detector, [item for _, item in ok]) if ok else [])
+        except Exception as e:
+            results = iter([e] * len(ok))
+        for c, actual_time, img, item in prepared:
+            detections = next(results) if img is not None else item
+            if isinstance(detections, Exception):
+                yield c, img, actual_time, "ERROR", [str(detections)], []
+                continue
+            level, hits = classify_result(detections)
+            yield c, img, actual_time, level, hits, detections
+
+    with ThreadPoolExecutor(max_workers=max(prep_threads, 1)) as pool:
+        batch = []
+        for c, frame, actual_time in frames:
+            batch.append((c, actual_time, pool.submit(_prepare, frame, max_width)))
+            if len(batch) >= batch_size:
+                yield from run(batch)
+                batch = []
+        if batch:
+            yield from run(batch)
+
+
+def _frame_result(actual_time: float, level: str, hits: list, detections: list) -> dict:
+    return {"time": round(actual_time, 3), "level": level, "hits": hits, "detections": detections}
+
+
+def moderate_video(video_path: str, output_dir: str = OUTPUT_DIR, threshold: float = SIZE_RATIO_THRESHOLD,
+                   interval: float = MIN_INTERVAL_SEC, save: str = "flagged", verify: bool = False,
+                   max_width: int | None = None, threads: int = 1, batch_size: int = BATCH_SIZE,
+                   prep_threads: int = PREPROCESS_THREADS, detector=None, onnx_threads: int = ONNX_THREADS,
+                   use_cache: bool = True, image_format: str = "jpg", quality: int | None = None,
+                   on_frame=None) -> dict:
+    """
+    单个视频完整审核流程，返回统计：候选数 / 实际分类帧数 / 各等级计数 / 写出的图片数 / 风险帧列表
+    save：none=不写图片，flagged=只写中 / 高风险帧，all=每个分类过的帧都写
+    detector 可由调用方传入复用（如常驻服务），否则新建
+    on_frame：每分类完一帧回调一次，参数为 {time, level, hits, detections}（常驻服务用来流式返回结果）
+    """
+    t0 = time.perf_counter()
+    print(f"视频：{video_path}")
+    print(f"阈值：{threshold}x  最小间隔：{interval}s")
+    print("第一遍：压缩域粗筛...")
+    candidates = collect_candidate_pts(video_path, threshold, interval, use_cache=use_cache)
+
+    stats = {"video": video_path, "candidates": len(candidates), "classified": 0, "saved": 0,
+             "HIGH": 0, "MEDIUM": 0, "SAFE": 0, "ERROR": 0, "flagged": []}
+    if candidates:
+        print(f"\n第二遍：解码 + 检测（共 {len(candidates)} 个候选帧）...")
+        if detector is None:
+            detector = create_detector(onnx_threads)
+        if save != "none":
+            os.makedirs(output_dir, exist_ok=True)
+
+        frames = iter_candidate_frames(video_path, candidates, verify, max_width, threads)
+        for c, img, actual_time, level, hits, detections in classify_frames(frames, detector, batch_size,
+                                                                            prep_threads, max_width):
+            if on_frame is not None:
+                on_frame(_frame_result(actual_time, level, hits, detections))
+            stats["classified"] += 1
+            stats[level] += 1
+            if level != "SAFE":
+                print(f"  {actual_time:>9.2f}s  {LEVEL_DISPLAY.get(level, '[错误]'):<8} {', '.join(hits)}")
+                if level != "ERROR":
+                    stats["flagged"].append({"time": round(actual_time, 3), "level": level, "hits": hits})
+            if img is not None and (save == "all" or (save == "flagged" and level in ("HIGH", "MEDIUM"))):
+                stats["saved"] += _write_capture(c, img, actual_time, output_dir, image_format, quality)
+
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+
+def priority_order(times: list[float], spread: int = VERDICT_SPREAD) -> list[int]:
+    """
+    按时间升序排列的候选帧的检测优先级（返回下标）：先取 spread 个离时间轴等分点最近的候选帧（含首尾），
+    之后每次在时间上最大的空档里取离中点最近的候选帧（二分补点），直到取完
+    按时间而不是按下标均分，候选帧扎堆的片段不会占掉前几轮；spread 小于 2 也按 2 算，首尾总是先取，
+    否则建不出空档，只会检测第一帧
+    """
+    n = len(times)
+    if n == 0:
+        return []
+    t = np.asarray(times, dtype=np.float64)
+
+    def nearest(target: float, lo: int, hi: int) -> int:
+        """[lo, hi] 范围内时间离 target 最近的下标"""
+        k = int(np.clip(np.searchsorted(t, target), lo, hi))
+        return k - 1 if k > lo and target - t[k - 1] <= t[k] - target else k
+
+    first = sorted({nearest(target, 0, n - 1) for target in np.linspace(t[0], t[-1], min(max(spread, 2), n))})
+    order = list(first)
+    gaps = [(-(t[hi] - t[lo]), lo, hi) for lo, hi in zip(first, first[1:]) if hi - lo > 1]
+    heapq.heapify(gaps)
+    while gaps:
+        _, lo, hi = heapq.heappop(gaps)
+        mid = nearest((t[lo] + t[hi]) / 2, lo + 1, hi - 1)
+        order.append(mid)
+        for a, b in ((lo, mid), (mid, hi)):
+            if b - a > 1:
+                heapq.heappush(gaps, (-(t[b] - t[a]), a, b))
+    return order
+
+
+def _seek_and_prepare(video_path: str, c: dict, max_width: int | None, threads: int):
+    """按优先级跳着取帧，每帧单独 seek 解码一个 GOP；在线程池里执行，多帧并行"""
+    img, actual_time = decode_frame_by_seek(video_path, c["time"], max_width, threads)
+    if img is None:
+        raise ValueError("解码失败")
+    return actual_time, img, preprocess(img)
+
+
+def verdict_video(video_path: str, threshold: float = SIZE_RATIO_THRESHOLD, interval: float = MIN_INTERVAL_SEC,
+                  stop_after: int = STOP_AFTER_HIGH, spread: int = VERDICT_SPREAD, max_width: int | None = None,
+                  threads: int = 1, batch_size: int = BATCH_SIZE, prep_threads: int = PREPROCESS_THREADS,
+                  detector=None, onnx_threads: int = ONNX_THREADS, use_cache: bool = True,
+                  output_dir: str | None = None, image_format: str = "jpg", quality: int | None = None,
+                  on_frame=None) -> dict:
+    """
+    单视频结论：候选帧按 priority_order 分批检测，高风险命中达到 stop_after 帧即提前结束
+    返回 verdict（见到的最高等级）、classified（拿到检测结果的帧数）、stopped_early 等；
+    解码失败、推理失败分别计入 decode_errors、infer_errors（ERROR 为两者之和），都不算 classified；
+    output_dir 不为空时把高风险帧写出；on_frame 同 moderate_video
+    """
+    t0 = time.perf_counter()
+    print(f"视频：{video_path}")
+    print("第一遍：压缩域粗筛...")
+    candidates = sorted(collect_candidate_pts(video_path, threshold, interval, use_cache=use_cache),
+                        key=lambda c: c["time"])
+    order = [candidates[i] for i in priority_order([c["time"] for c in candidates], spread)]
+
+    stats = {"video": video_path, "candidates": len(candidates), "classified": 0, "saved": 0,
+             "verdict": "SAFE", "stopped_early": False, "HIGH": 0, "MEDIUM": 0, "SAFE": 0, "ERROR": 0,
+             "decode_errors": 0, "infer_errors": 0, "flagged": []}
+    if order:
+        print(f"\n第二遍：按优先级检测（共 {len(order)} 个候选帧，高风险 {stop_after} 帧即停止）...")
+        if detector is None:
+            detector = create_detector(onnx_threads)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=max(prep_threads, 1)) as pool:
+            def submit(start):
+                return [(c, pool.submit(_seek_and_prepare, video_path, c, max_width, threads))
+                        for c in order[start:start + batch_size]]
+
+            batch = submit(0)
+            for start in range(0, len(order), batch_size):
+                following = submit(start + batch_size)   # 推理当前批时，下一批已在解码
+                prepared = []
+                for c, future in batch:
+                    try:
+                        prepared.append((c, *future.result()))
+                    except Exception as e:
+                        print(f"  [跳过] {c['time']:.2f}s {e}")
+                        stats["decode_errors"] += 1
+                        stats["ERROR"] += 1
+                try:
+                    results = detect_preprocessed(detector, [item for *_, item in prepared]) if prepared else []
+                except Exception as e:
+                    # 与 classify_frames 一致：整批推理失败时这批帧都记为 ERROR，继续下一批
+                    print(f"  [错误] {len(prepared)} 帧推理失败：{e}")
+                    results = [e] * len(prepared)
+                for (c, actual_time, img, _), detections in zip(prepared, results):
+                    if isinstance(detections, Exception):
+                        stats["infer_errors"] += 1
+                        stats["ERROR"] += 1
+                        if on_frame is not None:
+                            on_frame(_frame_result(actual_time, "ERROR", [str(detections)], []))
+                        continue
+                    level, hits = classify_result(detections)
+                    if on_frame is not None:
+                        on_frame(_frame_result(actual_time, level, hits, detections))
+                    stats["classified"] += 1
+                    stats[level] += 1
+                    if LEVEL_RANK[level] > LEVEL_RANK[stats["verdict"]]:
+                        stats["verdict"] = level
+                    if level == "SAFE":
+                        continue
+                    print(f"  {actual_time:>9.2f}s  {LEVEL_DISPLAY[level]:<8} {', '.join(hits)}")
+                    stats["flagged"].append({"time": round(actual_time, 3), "level": level, "hits": hits})
+                    if level == "HIGH" and output_dir:
+                        stats["saved"] += _write_capture(c, img, actual_time, output_dir, image_format, quality)
+                if stats["HIGH"] >= stop_after:
+                    stats["stopped_early"] = start + batch_size < len(order)
+                    for _, future in following:
+                        future.cancel()
+                    break
+                batch = following
+
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+
+def print_verdict(stats: dict) -> None:
+    print("\n" + "=" * 70)
+    print(f"结论：{stats['verdict']}  （候选帧 {stats['candidates']} 个，实际分类 {stats['classified']} 帧，"
+          f"耗时 {stats['seconds']:.1f}s）")
+    if stats["stopped_early"]:
+        remaining = stats["candidates"] - stats["classified"] - stats["ERROR"]
+        print(f"  高风险命中 {stats['HIGH']} 帧，已提前停止，剩余 {remaining} 帧未检测")
+    if stats["ERROR"]:
+        print(f"  出错 {stats['ERROR']} 帧（解码失败 {stats['decode_errors']}，推理失败 {stats['infer_errors']}，"
+              f"未参与结论）")
+    for item in stats["flagged"]:
+        if item["level"] == "HIGH":
+            print(f"  {item['time']:>9.2f}s  {', '.join(item['hits'])}")
+
+
+def print_summary(stats: dict, output_dir: str) -> None:
+    print("\n" + "=" * 70)
+    print(f"检测完成！候选帧 {stats['candidates']} 个，实际分类 {stats['classified']} 帧，"
+          f"耗时 {stats['seconds']:.1f}s")
+    print(f"  高风险 (HIGH)  : {stats['HIGH']} 帧")
+    print(f"  中风险 (MEDIUM): {stats['MEDIUM']} 帧")
+    print(f"  安全   (SAFE)  : {stats['SAFE']} 帧")
+    if stats["ERROR"]:
+        print(f"  出错           : {stats['ERROR']} 帧")
+    print(f"  写出图片       : {stats['saved']} 张" + (f" → {output_dir}" if stats["saved"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频审核：场景切换截图直接送 NudeNet 检测，不经过 JPEG 落盘")
+    parser.add_argument("--path",      required=True, help="视频文件路径，或 HTTP(S) 媒体直链")
+    parser.add_argument("--ytdlp",     action="store_true", help="--path 是网页地址，先用 yt-dlp 解析出视频直链")
+    parser.add_argument("--output",    default=OUTPUT_DIR, help="需要保存图片时的输出目录，默认 OUTPUT_DIR")
+    parser.add_argument("--save",      choices=["none", "flagged", "all"], default="flagged",
+                        help="写图片的范围：none=不写，flagged=只写中 / 高风险帧（默认），all=全部")
+    parser.add_argument("--threshold", type=float, default=SIZE_RATIO_THRESHOLD, help=f"包大小突增倍数阈值，默认 {SIZE_RATIO_THRESHOLD}")
+    parser.add_argument("--interval",  type=float, default=MIN_INTERVAL_SEC, help=f"相邻截图最小间隔秒数，默认 {MIN_INTERVAL_SEC}")
+    parser.add_argument("--verify",    action="store_true", help="用前后帧缩略图做像素域校验，过滤误报的场景切换")
+    parser.add_argument("--max-width", type=int, default=None, help="送检前把帧缩小到的最大宽度，默认保持原分辨率")
+    parser.add_argument("--threads",   type=int, default=1, help="解码线程数，0=按 CPU 核数自动，默认 1")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"每批推理的帧数，默认 {BATCH_SIZE}")
+    parser.add_argument("--prep-threads", type=int, default=PREPROCESS_THREADS, help=f"转换预处理线程数，默认 {PREPROCESS_THREADS}")
+    parser.add_argument("--onnx-threads", type=int, default=ONNX_THREADS, help="ONNX Runtime 算子内线程数，默认 0 = 自动")
+    parser.add_argument("--image-format", choices=["jpg", "webp"], default="jpg", help="保存图片的格式，默认 jpg")
+    parser.add_argument("--quality",   type=int, default=None, help="保存图片的编码质量 1-100")
+    parser.add_argument("--no-cache",  action="store_true", help="不读写包索引缓存")
+    parser.add_argument("--verdict",   action="store_true",
+                        help="只要结论：按优先级检测，高风险命中达到 --stop-after 帧即停止（不做 --verify；--save 只写高风险帧）")
+    parser.add_argument("--stop-after", type=int, default=STOP_AFTER_HIGH, help=f"--verdict 时高风险命中多少帧即停止，默认 {STOP_AFTER_HIGH}")
+    parser.add_argument("--spread",    type=int, default=VERDICT_SPREAD, help=f"--verdict 第一轮均匀取帧数，默认 {VERDICT_SPREAD}")
+    args = parser.parse_args()
+    if args.spread < 1:
+        parser.error("--spread 至少为 1")
+
+    video_path = args.path
+    if args.ytdlp:
+        print(f"yt-dlp 解析直链：{video_path}")
+        video_path = resolve_url(video_path)
+    if not is_url(video_path) and not os.path.exists(video_path):
+        print(f"视频文件不存在：{video_path}")
+        sys.exit(1)
+
+    if args.verdict:
+        stats = verdict_video(
+            video_path, args.threshold, args.interval, stop_after=max(args.stop_after, 1), spread=args.spread,
+            max_width=args.max_width, threads=args.threads, batch_size=max(args.batch_size, 1),
+            prep_threads=args.prep_threads, onnx_threads=args.onnx_threads, use_cache=not args.no_cache,
+            output_dir=None if args.save == "none" else args.output,
+            image_format=args.image_format, quality=args.quality,
+        )
+        print_verdict(stats)
+        sys.exit(2 if stats["verdict"] == "HIGH" else 0)
+
+    stats = moderate_video(
+        video_path, args.output, args.threshold, args.interval, save=args.save, verify=args.verify,
+        max_width=args.max_width, threads=args.threads, batch_size=max(args.batch_size, 1),
+        prep_threads=args.prep_threads, onnx_threads=args.onnx_threads, use_cache=not args.no_cache,
+        image_format=args.image_format, quality=args.quality,
+    )
+    print_summary(stats, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+MP4 / MOV 快速路径：直接解析 moov 里的样本表得到每个视频包的 大小 / pts / 关键帧标记，不经过 PyAV 拆包
+  stsz  每个样本（= 包）的大小
+  stss  同步样本（关键帧）序号；没有该表时所有样本都是关键帧
+  stts  解码时间增量（游程编码）
+  ctts  显示时间偏移（游程编码，有 B 帧时才有）
+  elst  编辑列表：FFmpeg 按第一个有效编辑的 media_time 平移时间戳
+
+本地文件用 mmap 只读映射，样本表用 np.frombuffer 直接在映射内存上展开，
+10GB 的文件也只需要读几 MB 的 moov；远程 URL 通过 HttpRangeFile 只拉取盒子头和 moov。
+分片 MP4（moov 里有 mvex / 顶层有 moof）、非 MP4 或不常见的编辑列表返回 None，由调用方回退到拆包。
+"""
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from remote_source import HttpRangeFile, is_url
+
+MP4_EXTENSIONS = {".mp4", ".m4v", ".mov", ".3gp"}
+
+
+def _iter_boxes(buf, start: int, end: int):
+    """遍历 buf[start:end] 里的同级盒子，产出 (类型, 内容起点, 内容终点)"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _child(buf, start: int, end: int, box_type: bytes):
+    for t, s, e in _iter_boxes(buf, start, end):
+        if t == box_type:
+            return s, e
+    return None
+
+
+def _read_moov(f) -> bytes | None:
+    """
+    按顶层盒子头逐个跳过（只 seek 不读内容），找到 moov 后读出整个 moov
+    遇到 moof（分片 MP4）或不是 MP4 时返回 None
+    """
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    pos = 0
+    first = True
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        head = f.read(16)
+        if len(head) < 8:
+            return None
+        size, box_type = struct.unpack_from(">I4s", head, 0)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", head, 8)[0]
+            header = 16
+        elif size == 0:
+            size = file_size - pos
+        if first and box_type not in (b"ftyp", b"moov", b"free", b"skip", b"wide", b"mdat"):
+            return None
+        first = False
+        if box_type == b"moof" or size < header:
+            return None
+        if box_type == b"moov":
+            f.seek(pos)
+            return f.read(size)
+        pos += size
+    return None
+
+
+def _parse_video_trak(moov: bytes) -> dict | None:
+    """在 moov 里找第一个视频轨，展开样本表；遇到不支持的结构返回 None"""
+    moov_start, moov_end = 8, len(moov)
+    size, box_type = struct.unpack_from(">I4s", moov, 0)
+    if size == 1:
+        moov_start = 16
+    if _child(moov, moov_start, moov_end, b"mvex"):
+        return None                                # 分片 MP4，样本表在各个 moof 里
+
+    mvhd = _child(moov, moov_start, moov_end, b"mvhd")
+    if mvhd is None:
+        return None
+    version = moov[mvhd[0]]
+    movie_timescale = struct.unpack_from(">I", moov, mvhd[0] + (20 if version == 1 else 12))[0]
+
+    for box_type, trak_s, trak_e in _iter_boxes(moov, moov_start, moov_end):
+        if box_type != b"trak":
+            continue
+        mdia = _child(moov, trak_s, trak_e, b"mdia")
+        if mdia is None:
+            continue
+        hdlr = _child(moov, *mdia, b"hdlr")
+        if hdlr is None or moov[hdlr[0] + 8:hdlr[0] + 12] != b"vide":
+            continue
+        return _parse_sample_tables(moov, trak_s, trak_e, mdia, movie_timescale)
+    return None
+
+
+def _parse_sample_tables(moov, trak_s, trak_e, mdia, movie_timescale) -> dict | None:
+    mdhd = _child(moov, *mdia, b"mdhd")
+    minf = _child(moov, *mdia, b"minf")
+    stbl = _child(moov, *minf, b"stbl") if minf else None
+    if mdhd is None or stbl is None:
+        return None
+    version = moov[mdhd[0]]
+    timescale = struct.unpack_from(">I", moov, mdhd[0] + (20 if version == 1 else 12))[0]
+
+    stsz = _child(moov, *stbl, b"stsz")
+    stts = _child(moov, *stbl, b"stts")
+    if stsz is None or stts is None or _child(moov, *stbl, b"sbgp"):
+        return None                                # 没有样本表，或用 sbgp 标记随机访问点（关键帧判定不同）
+
+    # stsz：固定大小或逐个列出
+    sample_size, count = struct.unpack_from(">II", moov, stsz[0] + 4)
+    if sample_size:
+        sizes = np.full(count, sample_size, dtype=np.int64)
+    else:
+        sizes = np.frombuffer(moov, dtype=">u4", count=count, offset=stsz[0] + 12).astype(np.int64)
+
+    # stts：游程编码的解码时间增量 → 每个样本的 dts
+    n = struct.unpack_from(">I", moov, stts[0] + 4)[0]
+    runs = np.frombuffer(moov, dtype=">u4", count=n * 2, offset=stts[0] + 8).reshape(-1, 2)
+    deltas = np.repeat(runs[:, 1].astype(np.int64), runs[:, 0].astype(np.int64))
+    if len(deltas) < count:
+        return None
+    dts = np.concatenate(([0], np.cumsum(deltas[:count - 1])))
+
+    # ctts：显示时间偏移
+    pts = dts
+    ctts = _child(moov, *stbl, b"ctts")
+    if ctts is not None:
+        n = struct.unpack_from(">I", moov, ctts[0] + 4)[0]
+        runs = np.frombuffer(moov, dtype=">u4", count=n * 2, offset=ctts[0] + 8).reshape(-1, 2)
+        offsets = runs[:, 1].astype(np.int32).astype(np.int64)   # 与 FFmpeg 一致，两个版本都按有符号读
+        offsets = np.repeat(offsets, runs[:, 0].astype(np.int64))
+        if len(offsets) < count:
+            return None
+        pts = dts + offsets[:count]
+
+    # elst：只支持 [可选的空编辑] + 一个正常速率的编辑，其它情况交给 FFmpeg
+    edts = _child(moov, trak_s, trak_e, b"edts")
+    elst = _child(moov, *edts, b"elst") if edts else None
+    if elst is not None:
+        version = moov[elst[0]]
+        n = struct.unpack_from(">I", moov, elst[0] + 4)[0]
+        fmt, step = (">QqHH", 20) if version == 1 else (">IiHH", 12)
+        entries = [struct.unpack_from(fmt, moov, elst[0] + 8 + i * step) for i in range(n)]
+        shift = 0
+        if entries and entries[0][1] == -1:        # 开头的空编辑：整体向后推迟
+            shift = entries[0][0] * timescale // max(movie_timescale, 1)
+            entries = entries[1:]
+        if len(entries) > 1 or (entries and entries[0][2] != 1):
+            return None
+        if entries:
+            shift -= entries[0][1]
+        pts = pts + shift
+
+    # stss：关键帧序号（从 1 开始）；没有该表时全部是关键帧
+    stss = _child(moov, *stbl, b"stss")
+    if stss is None:
+        keys = np.ones(count, dtype=bool)
+    else:
+        n = struct.unpack_from(">I", moov, stss[0] + 4)[0]
+        sync = np.frombuffer(moov, dtype=">u4", count=n, offset=stss[0] + 8).astype(np.int64) - 1
+        keys = np.zeros(count, dtype=bool)
+        keys[sync[sync < count]] = True
+
+    nonempty = sizes > 0                          # 与拆包路径一致，跳过空包
+    return {
+        "size":      sizes[nonempty],
+        "pts":       pts[nonempty],
+        "key":       keys[nonempty],
+        "pict":      None,
+        "time_base": (1, timescale),
+    }
+
+
+def read_mp4_packet_table(path: str) -> dict | None:
+    """
+    MP4 快速路径入口：本地文件 mmap、URL 按 Range 读取
+    不是 MP4 / 分片 MP4 / 结构不支持时返回 None
+    """
+    if is_url(path):
+        f = HttpRangeFile(path)
+        try:
+            moov = _read_moov(f)
+        finally:
+            f.close()
+    else:
+        if os.path.splitext(path)[1].lower() not in MP4_EXTENSIONS:
+            return None
+        with open(path, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                moov = _read_moov(mm)
+    if moov is None:
+        return None
+    try:
+        return _parse_video_trak(moov)
+    except (struct.error, ValueError, IndexError):
+        return None
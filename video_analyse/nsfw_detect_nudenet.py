@@ -2,13 +2,32 @@
 涉黄检测脚本
 对 Capture 目录下所有截图逐一分析，输出风险等级和详情
 
+图片按批预处理后一次送进 ONNX 模型（--batch-size），ONNX Runtime 线程数可用 --threads 指定
+流水线：线程池（--prep-threads）读图预处理，按批放进有界队列；推理在主进程，或 --workers 个
+各自持有 NudeDetector 的子进程里进行；结果按输入顺序输出，汇总与逐张处理时一致
+原始检测结果按图片内容哈希 + 模型版本缓存（见 detection_cache.py），重跑时只推理新图片（--no-cache 关闭）
+
 https://github.com/notAI-tech/NudeNet
 """
 
+import argparse
 import os
+import queue
 import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib.metadata import version
 from pathlib import Path
+
+import cv2
+import nudenet
+import numpy as np
+import onnxruntime
 from nudenet import NudeDetector
+from nudenet.nudenet import _postprocess, _read_image
+
+from detection_cache import DetectionCache, file_hash
 
 # ── 配置 ──────────────────────────────────────────────────────────────────────
 INPUT_DIR = r"d:\YouTube\video_analyse\temp\Capture"
@@ -46,6 +65,24 @@ SAFE_LABELS = {
 # 判定为高风险的置信度阈值
 HIGH_RISK_THRESHOLD = 0.5
 MEDIUM_RISK_THRESHOLD = 0.4
+
+# 每批送进模型的图片数；模型输入边长（NudeNet 自带的 320n 模型）
+BATCH_SIZE = 8
+INFERENCE_SIZE = 320
+
+# ONNX Runtime 算子内线程数，0 表示用 ONNX Runtime 默认值（物理核数）
+ONNX_THREADS = 0
+
+# 读图预处理的线程数
+PREPROCESS_THREADS = 4
+
+# 推理子进程数；0 表示在主进程推理（ONNX Runtime 推理时释放 GIL，仍与预处理线程并行）
+INFER_WORKERS = 0
+
+# 预处理好、等待推理的批次上限，防止读图跑得比推理快时占满内存
+QUEUE_BATCHES = 4
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
 # ─────────────────────────────────────────────────────────────────────────────
 
 
@@ -73,15 +110,254 @@ def classify_result(detections: list) -> tuple[str, list]:
     return "SAFE", []
 
 
+def create_detector(threads: int = ONNX_THREADS) -> NudeDetector:
+    """创建检测器；threads > 0 时按指定的算子内线程数重建 ONNX 会话"""
+    detector = NudeDetector(inference_resolution=INFERENCE_SIZE)
+    if threads > 0:
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        model_path = os.path.join(os.path.dirname(nudenet.__file__), "320n.onnx")
+        detector.onnx_session = onnxruntime.InferenceSession(
+            model_path, sess_options=options, providers=detector.onnx_session.get_providers(),
+        )
+    return detector
+
+
+def load_image(img_path) -> np.ndarray:
+    """读成 BGR 数组，等同 cv2.imread；用 imdecode 读字节，Windows 中文路径也能打开"""
+    mat = cv2.imdecode(np.fromfile(str(img_path), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if mat is None:
+        raise ValueError("无法解码图片")
+    return mat
+
+
+def preprocess(image, input_size: int = INFERENCE_SIZE) -> tuple:
+    """读图并缩放填充成模型输入，返回 (输入张量, 后处理需要的尺寸信息)；image 可为路径或 BGR 数组"""
+    mat = image if isinstance(image, np.ndarray) else load_image(image)
+    blob, x_ratio, y_ratio, x_pad, y_pad, width, height = _read_image(mat, input_size)
+    return blob, (x_pad, y_pad, x_ratio, y_ratio, width, height)
+
+
+def detect_preprocessed(detector: NudeDetector, items: list) -> list[list]:
+    """一批预处理好的图片拼成一个张量，跑一次模型，再逐张后处理成检测结果"""
+    batch = np.vstack([blob for blob, _ in items])
+    output = detector.onnx_session.run(None, {detector.input_name: batch})[0]
+    return [
+        _postprocess([output[j:j + 1]], *meta, detector.input_width, detector.input_height)
+        for j, (_, meta) in enumerate(items)
+    ]
+
+
+def detect_images(detector: NudeDetector, images: list, batch_size: int = BATCH_SIZE):
+    """
+    按批检测，按输入顺序产出 (图片, 检测结果或异常)
+    单张图读取失败只影响它自己，不会拖垮整批
+    """
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        results = [None] * len(chunk)
+        items = []                                 # (在 chunk 中的位置, 预处理结果)
+        for j, image in enumerate(chunk):
+            try:
+                items.append((j, preprocess(image, detector.input_width)))
+            except Exception as e:
+                results[j] = e
+        if items:
+            try:
+                batch_results = detect_preprocessed(detector, [item for _, item in items])
+            except Exception as e:
+                batch_results = [e] * len(items)
+            for (j, _), detections in zip(items, batch_results):
+                results[j] = detections
+        yield from zip(chunk, results)
+
+
+# 推理子进程里的检测器，由 _init_worker 创建，整个进程生命周期内复用
+_WORKER_DETECTOR = None
+
+
+def _init_worker(onnx_threads: int) -> None:
+    global _WORKER_DETECTOR
+    _WORKER_DETECTOR = create_detector(onnx_threads)
+
+
+def _infer_in_worker(items: list) -> list[list]:
+    return detect_preprocessed(_WORKER_DETECTOR, items)
+
+
+def _preprocess_safe(image, input_size: int):
+    try:
+        return preprocess(image, input_size)
+    except Exception as e:
+        return e
+
+
+def _feed_batches(images: list, batch_size: int, pool: ThreadPoolExecutor, q: queue.Queue,
+                  input_size: int, stop: threading.Event) -> None:
+    """
+    按批把预处理任务交给线程池，(图片, future 列表) 放进有界队列；队列满时等待，读图不会跑太远
+    消费方提前结束时置 stop，这里随即退出：每次提交前都先看 stop，不往已关闭的线程池里提交
+    """
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        futures = []
+        for image in chunk:
+            if stop.is_set():
+                return
+            futures.append(pool.submit(_preprocess_safe, image, input_size))
+        if not put((chunk, futures)):
+            return
+    put(None)
+
+
+def detect_images_parallel(images: list, batch_size: int = BATCH_SIZE, threads: int = PREPROCESS_THREADS,
+                           workers: int = INFER_WORKERS, onnx_threads: int = ONNX_THREADS,
+                           detector: NudeDetector | None = None):
+    """
+    流水线检测，按输入顺序产出 (图片, 检测结果或异常)
+    workers > 0 时推理交给子进程池，每个进程持有一个 NudeDetector；否则用 detector（没有则新建）在主进程推理
+    """
+    q = queue.Queue(maxsize=QUEUE_BATCHES)
+    prep_pool = ThreadPoolExecutor(max_workers=max(threads, 1))
+    infer_pool = None
+    if workers > 0:
+        infer_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(onnx_threads,))
+    elif detector is None:
+        detector = create_detector(onnx_threads)
+
+    stop = threading.Event()
+    feeder = threading.Thread(target=_feed_batches, args=(images, batch_size, prep_pool, q, INFERENCE_SIZE, stop),
+                              daemon=True)
+    feeder.start()
+
+    def finish(chunk, results, items, outcome):
+        """把推理结果（或异常）填回该批各自的位置"""
+        try:
+            batch_results = outcome() if items else []
+        except Exception as e:
+            batch_results = [e] * len(items)
+        for (j, _), detections in zip(items, batch_results):
+            results[j] = detections
+        return zip(chunk, results)
+
+    pending = deque()                              # 按提交顺序排队的 (chunk, results, items, future)
+    try:
+        while True:
+            entry = q.get()
+            if entry is None:
+                break
+            chunk, futures = entry
+            results = [f.result() for f in futures]
+            items = [(j, r) for j, r in enumerate(results) if not isinstance(r, Exception)]
+            batch = [r for _, r in items]
+            if infer_pool is None:
+                yield from finish(chunk, results, items, lambda: detect_preprocessed(detector, batch))
+                continue
+            future = infer_pool.submit(_infer_in_worker, batch) if batch else None
+            pending.append((chunk, results, items, future))
+            while len(pending) > workers * 2:      # 每个进程最多排两批，多了就先等最早的一批
+                c, r, it, f = pending.popleft()
+                yield from finish(c, r, it, f.result if f else None)
+        while pending:
+            c, r, it, f = pending.popleft()
+            yield from finish(c, r, it, f.result if f else None)
+    finally:
+        stop.set()
+        feeder.join()                              # 等喂数据线程看到 stop 退出后再关线程池
+        prep_pool.shutdown(wait=False, cancel_futures=True)
+        if infer_pool is not None:
+            infer_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def model_version() -> str:
+    """缓存键里的模型版本：nudenet 包版本 + 模型文件 + 输入边长，任何一个变了旧结果都不再使用"""
+    return f"nudenet-{version('nudenet')}/320n.onnx/{INFERENCE_SIZE}"
+
+
+def _hash_safe(path) -> str | None:
+    try:
+        return file_hash(path)
+    except OSError:
+        return None
+
+
+def detect_images_cached(images: list, cache: DetectionCache, threads: int = PREPROCESS_THREADS, **pipeline_opts):
+    """
+    先用线程池算出所有图片的内容哈希并批量查缓存，只把没命中的图片送进流水线
+    返回按输入顺序产出 (图片, 检测结果或异常) 的迭代器，新结果每批写回缓存（出错的不缓存）
+    """
+    model = model_version()
+    with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+        hashes = list(pool.map(_hash_safe, images))
+    cached = cache.get_many([h for h in hashes if h], model)
+
+    # 只推理没命中的图片；内容相同的只推理第一张
+    todo, seen = [], set()
+    for image, h in zip(images, hashes):
+        if h in cached or (h is not None and h in seen):
+            continue
+        seen.add(h)
+        todo.append(image)
+    print(f"缓存命中 {len(images) - len(todo)} 张，需要推理 {len(todo)} 张\n")
+
+    fresh = detect_images_parallel(todo, threads=threads, **pipeline_opts) if todo else iter(())
+
+    def merge():
+        done = {}                                  # 本次推理过的 哈希 → 结果（含异常），给内容重复的图片复用
+        new_rows = []
+        for image, h in zip(images, hashes):
+            if h in cached:
+                yield image, cached[h]
+                continue
+            if h is not None and h in done:
+                yield image, done[h]
+                continue
+            _, detections = next(fresh)
+            if h is not None:
+                done[h] = detections
+                if not isinstance(detections, Exception):
+                    new_rows.append((h, detections))
+            if len(new_rows) >= 64:
+                cache.put_many(new_rows, model)
+                new_rows = []
+            yield image, detections
+        if new_rows:
+            cache.put_many(new_rows, model)
+
+    return merge()
+
+
 def main():
-    input_dir = Path(INPUT_DIR)
+    parser = argparse.ArgumentParser(description="NudeNet 涉黄检测：批量分析截图目录")
+    parser.add_argument("--input", default=INPUT_DIR, help=f"截图目录，默认 {INPUT_DIR}")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"每批推理的图片数，默认 {BATCH_SIZE}")
+    parser.add_argument("--threads", type=int, default=ONNX_THREADS,
+                        help="ONNX Runtime 算子内线程数，默认 0 = 自动")
+    parser.add_argument("--prep-threads", type=int, default=PREPROCESS_THREADS,
+                        help=f"读图预处理线程数，默认 {PREPROCESS_THREADS}")
+    parser.add_argument("--workers", type=int, default=INFER_WORKERS,
+                        help="推理子进程数，每个进程加载一份模型；默认 0 = 在主进程推理")
+    parser.add_argument("--no-cache", action="store_true", help="不读写检测结果缓存，全部重新推理")
+    args = parser.parse_args()
+
+    input_dir = Path(args.input)
     if not input_dir.exists():
-        print(f"目录不存在：{INPUT_DIR}")
+        print(f"目录不存在：{args.input}")
         sys.exit(1)
 
     images = sorted(
         p for p in input_dir.iterdir()
-        if p.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+        if p.suffix.lower() in IMAGE_EXTENSIONS
     )
 
     if not images:
@@ -89,17 +365,25 @@ def main():
         sys.exit(1)
 
     print(f"共找到 {len(images)} 张图片，开始检测...\n")
+
+    pipeline_opts = dict(batch_size=max(args.batch_size, 1), threads=args.prep_threads,
+                         workers=args.workers, onnx_threads=args.threads)
+    cache = None if args.no_cache else DetectionCache()
+    if cache is None:
+        results = detect_images_parallel(images, **pipeline_opts)
+    else:
+        results = detect_images_cached(images, cache, **pipeline_opts)
+
     print(f"{'文件名':<40} {'风险等级':<8} 触发项")
     print("-" * 90)
 
-    detector = NudeDetector()
-
     stats = {"HIGH": 0, "MEDIUM": 0, "SAFE": 0}
     high_risk_files = []
 
-    for i, img_path in enumerate(images, 1):
+    for i, (img_path, detections) in enumerate(results, 1):
         try:
-            detections = detector.detect(str(img_path))
+            if isinstance(detections, Exception):
+                raise detections
             for det in detections:
                 print(f"  [RAW] {det}")
             level, hits = classify_result(detections)
@@ -132,6 +416,9 @@ def main():
         for f in high_risk_files:
             print(f"  - {f}")
 
+    if cache is not None:
+        cache.close()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,241 @@
+"""
+视频 packet 索引缓存
+第一次拆包时把每个 packet 的 大小 / pts / 关键帧标记（以及可选的帧类型）写成 .npy 侧车文件，
+之后 scene_detect.py、test/frame_packet_size.py 直接内存映射读取，不再重新拆包。
+
+缓存文件放在 INDEX_DIR 下：
+  <key>.npy   结构化数组，每个 packet 一行：pts(int64) size(int32) key(bool) pict(uint8)
+  <key>.json  元数据：源文件路径 / 大小 / mtime、time_base、是否含帧类型
+key 由源文件绝对路径哈希得到；文件大小或 mtime 变了即视为失效，重新拆包。
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import av
+import numpy as np
+
+from mp4_index import read_mp4_packet_table
+from remote_source import is_url, open_container, register_url_headers, url_headers
+
+# ── 配置 ──────────────────────────────────────────────────────────────────────
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp", "packet_index")
+
+# 索引格式版本，字段变化时递增，旧缓存自动失效
+INDEX_VERSION = 2
+# ─────────────────────────────────────────────────────────────────────────────
+
+INDEX_DTYPE = np.dtype([("pts", "<i8"), ("size", "<i4"), ("key", "?"), ("pict", "u1")])
+
+# 帧类型编码，与 PyAV pict_type 的整数值一致；0 表示没有解码出帧或类型未知
+PICT_CODES = {"I": 1, "P": 2, "B": 3, "S": 4, "SI": 5, "SP": 6, "BI": 7}
+PICT_NAMES = {v: k for k, v in PICT_CODES.items()}
+
+
+def build_packet_table(video_path: str) -> dict:
+    """只拆包不解码，把每个 packet 的大小 / pts / 关键帧标记收集成 NumPy 列（跳过空包）"""
+    container = open_container(video_path, video_only=True)
+    stream = container.streams.video[0]
+    sizes, pts, keys = [], [], []
+    for packet in container.demux(stream):
+        if packet.size == 0:               # flush packet，跳过
+            continue
+        sizes.append(packet.size)
+        pts.append(packet.pts or 0)        # pts 缺失按 0 处理，与时间计算保持一致
+        keys.append(packet.is_keyframe)
+    time_base = stream.time_base
+    container.close()
+    return make_table(sizes, pts, keys, (time_base.numerator, time_base.denominator))
+
+
+def keyframe_boundaries(video_path: str, parts: int) -> list[int]:
+    """
+    把视频按时长大致等分成 parts 段，每个切分点 seek 到其前面最近的关键帧，
+    返回这些关键帧的 pts（升序去重，不含开头）；只读少量数据，不拆整个文件
+    """
+    boundaries = set()
+    with open_container(video_path, video_only=True) as container:
+        stream = container.streams.video[0]
+        if not container.duration or parts < 2:
+            return []
+        duration = float(container.duration) / av.time_base
+        for k in range(1, parts):
+            target = int(duration * k / parts / stream.time_base)
+            container.seek(target, any_frame=False, backward=True, stream=stream)
+            for packet in container.demux(stream):
+                if packet.size == 0:
+                    continue
+                if packet.is_keyframe and packet.pts:
+                    boundaries.add(packet.pts)
+                break
+    return sorted(boundaries)
+
+
+def _demux_range(video_path: str, start_pts: int | None, end_pts: int | None) -> tuple[list, list, list]:
+    """
+    拆包 [start_pts 关键帧, end_pts 关键帧) 这一段，返回 (sizes, pts, keys) 三列
+    以解码顺序中的关键帧包为界，各段首尾相接后与整文件顺序拆包的结果完全相同
+    """
+    sizes, pts, keys = [], [], []
+    with open_container(video_path, video_only=True) as container:
+        stream = container.streams.video[0]
+        started = start_pts is None
+        if not started:
+            container.seek(start_pts, any_frame=False, backward=True, stream=stream)
+        for packet in container.demux(stream):
+            if packet.size == 0:
+                continue
+            if packet.is_keyframe and packet.pts is not None:
+                if end_pts is not None and packet.pts >= end_pts:
+                    break
+                if not started and packet.pts >= start_pts:
+                    started = True
+            if not started:                 # seek 落在更早的关键帧上，跳到本段起点
+                continue
+            sizes.append(packet.size)
+            pts.append(packet.pts or 0)
+            keys.append(packet.is_keyframe)
+    return sizes, pts, keys
+
+
+def build_packet_table_parallel(video_path: str, parts: int) -> dict:
+    """按关键帧把文件切成 parts 段，多进程分段拆包后按顺序拼接成完整的表"""
+    bounds = keyframe_boundaries(video_path, parts)
+    if not bounds:
+        return build_packet_table(video_path)
+    starts = [None] + bounds
+    ends = bounds + [None]
+    with open_container(video_path) as container:
+        time_base = container.streams.video[0].time_base
+
+    sizes, pts, keys = [], [], []
+    with ProcessPoolExecutor(max_workers=len(starts), initializer=register_url_headers,
+                             initargs=(url_headers(),)) as pool:
+        for part in pool.map(_demux_range, [video_path] * len(starts), starts, ends):
+            sizes += part[0]
+            pts += part[1]
+            keys += part[2]
+    return make_table(sizes, pts, keys, (time_base.numerator, time_base.denominator))
+
+
+def make_table(sizes, pts, keys, time_base: tuple, picts=None) -> dict:
+    """把逐包收集的列表打包成统一的表结构；picts 为 None 表示没有帧类型"""
+    return {
+        "size":      np.asarray(sizes, dtype=np.int64),
+        "pts":       np.asarray(pts, dtype=np.int64),
+        "key":       np.asarray(keys, dtype=bool),
+        "pict":      None if picts is None else np.asarray(picts, dtype=np.uint8),
+        "time_base": (int(time_base[0]), int(time_base[1])),
+    }
+
+
+def packet_times(table: dict) -> np.ndarray:
+    """pts → 秒；先乘分子再除分母，结果与 float(pts * time_base) 逐位一致"""
+    num, den = table["time_base"]
+    return table["pts"].astype(np.float64) * num / den
+
+
+def table_duration(table: dict) -> float:
+    """按包时间估算视频流时长：最早到最晚的 pts 之差再加一帧，用于吞吐量统计，不必再打开视频"""
+    times = packet_times(table)
+    if len(times) == 0:
+        return 0.0
+    step = float(np.median(np.diff(np.sort(times)))) if len(times) > 1 else 0.0
+    return float(times.max() - times.min()) + step
+
+
+def _index_paths(video_path: str) -> tuple[str, str]:
+    abspath = os.path.normcase(os.path.abspath(video_path))
+    key = hashlib.sha1(abspath.encode("utf-8")).hexdigest()[:20]
+    base = os.path.join(INDEX_DIR, key)
+    return base + ".npy", base + ".json"
+
+
+def _source_stat(video_path: str) -> dict:
+    st = os.stat(video_path)
+    return {"path": os.path.abspath(video_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def load_packet_index(video_path: str, need_pict: bool = False) -> dict | None:
+    """
+    读取缓存索引（内存映射，不把整个文件读进内存）
+    缓存不存在、已失效，或 need_pict=True 但缓存里没有帧类型时返回 None
+    """
+    npy_path, meta_path = _index_paths(video_path)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        source = _source_stat(video_path)
+        if (meta.get("version") != INDEX_VERSION
+                or meta.get("size") != source["size"]
+                or meta.get("mtime_ns") != source["mtime_ns"]):
+            return None
+        if need_pict and not meta.get("has_pict"):
+            return None
+        rows = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    return {
+        "size":      rows["size"],
+        "pts":       rows["pts"],
+        "key":       rows["key"],
+        "pict":      rows["pict"] if meta.get("has_pict") else None,
+        "time_base": tuple(meta["time_base"]),
+    }
+
+
+def save_packet_index(video_path: str, table: dict) -> None:
+    """把表写成侧车缓存；先写临时文件再替换，避免中断留下半个索引"""
+    npy_path, meta_path = _index_paths(video_path)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+
+    rows = np.empty(len(table["size"]), dtype=INDEX_DTYPE)
+    rows["pts"] = table["pts"]
+    rows["size"] = table["size"]
+    rows["key"] = table["key"]
+    rows["pict"] = 0 if table.get("pict") is None else table["pict"]
+
+    meta = _source_stat(video_path)
+    meta.update({
+        "version":   INDEX_VERSION,
+        "time_base": list(table["time_base"]),
+        "has_pict":  table.get("pict") is not None,
+        "packets":   len(rows),
+    })
+
+    tmp_npy = npy_path + ".tmp.npy"
+    np.save(tmp_npy, rows)
+    os.replace(tmp_npy, npy_path)
+    tmp_meta = meta_path + ".tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_meta, meta_path)
+
+
+def get_packet_table(video_path: str, use_cache: bool = True, parts: int = 1) -> dict:
+    """
+    优先读缓存索引；其次 MP4 直接解析 moov 样本表；都不行再拆包（parts > 1 时按关键帧分段多进程拆包），
+    结果写入缓存。URL 没有稳定的大小 / mtime（直链常带时效 token），不做缓存
+    """
+    use_cache = use_cache and not is_url(video_path)
+    if use_cache:
+        table = load_packet_index(video_path)
+        if table is not None:
+            print(f"  使用包索引缓存（{len(table['size'])} 个包）")
+            return table
+    table = read_mp4_packet_table(video_path)
+    if table is not None:
+        print(f"  从 moov 样本表读取包信息（{len(table['size'])} 个包）")
+    elif parts > 1:
+        table = build_packet_table_parallel(video_path, parts)
+    else:
+        table = build_packet_table(video_path)
+    if use_cache:
+        try:
+            save_packet_index(video_path, table)
+        except OSError as e:
+            print(f"  [警告] 包索引缓存写入失败：{e}")
+    return table
@@ -0,0 +1,181 @@
+"""
+远程视频源：通过 HTTP Range 请求按需读取，不下载整个文件
+  - HttpRangeFile：给 PyAV 用的可 seek 只读文件对象，按块发 Range 请求并缓存最近的块
+  - resolve_url：网页地址（YouTube / Patreon 帖子等）先用 yt-dlp 解析出媒体直链和请求头
+  - open_container：本地路径和 URL 统一入口，scene_detect / packet_index 都通过它打开视频
+
+PyAV 只在需要时 seek + read，所以 moov / Cues 等索引和截图要用到的 GOP 之外的字节不会被拉取；
+第一遍拆包时其它流（音频）设为丢弃，不解析也不解码。数据能否少下载取决于文件布局：
+音视频分轨存放（如 moov 在前、音频单独成块）时音频字节基本不会被拉取；
+常见的交错存放（MKV / WebM / 普通 MP4）顺序拆包仍会整块读到夹在中间的音频数据。
+"""
+
+import os
+from collections import OrderedDict
+
+import av
+import requests
+
+# ── 配置 ──────────────────────────────────────────────────────────────────────
+# 每次 Range 请求的最小块大小；连续顺序读时会逐步放大，减少请求次数
+BLOCK_SIZE = 256 * 1024
+MAX_BLOCK_SIZE = 8 * 1024 * 1024
+
+# 内存里最多缓存多少块
+CACHE_BLOCKS = 32
+
+REQUEST_TIMEOUT = 30
+# ─────────────────────────────────────────────────────────────────────────────
+
+# yt-dlp 解析出的直链需要带的请求头（User-Agent / Referer / Cookie 等），按直链记录
+_URL_HEADERS: dict[str, dict] = {}
+
+# 已探测过的 URL 文件大小，同一进程里再次打开同一 URL 时不再发探测请求
+_URL_SIZES: dict[str, int] = {}
+
+
+def url_headers() -> dict[str, dict]:
+    """当前进程记下的直链请求头；开子进程时作为 initargs 传过去（Windows spawn 出的子进程看不到父进程的全局变量）"""
+    return dict(_URL_HEADERS)
+
+
+def register_url_headers(headers: dict[str, dict]) -> None:
+    """子进程初始化：登记父进程传来的直链请求头"""
+    _URL_HEADERS.update(headers)
+
+
+def is_url(path: str) -> bool:
+    return path.lower().startswith(("http://", "https://"))
+
+
+class HttpRangeFile:
+    """
+    基于 HTTP Range 的只读随机访问文件
+    读取按块对齐，命中缓存的块不再请求；顺序读时下一次请求的块大小翻倍（上限 MAX_BLOCK_SIZE），
+    发生 seek 跳转后回落到 BLOCK_SIZE
+    """
+
+    def __init__(self, url: str, headers: dict | None = None, session: requests.Session | None = None):
+        self.url = url
+        self.session = session or requests.Session()
+        self.headers = dict(headers or _URL_HEADERS.get(url, {}))
+        self.pos = 0
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._blocks = OrderedDict()               # 起始偏移 → bytes
+        self._next_size = BLOCK_SIZE
+        self._last_end = None
+        self.size = _URL_SIZES.get(url) or self._probe_size()
+        _URL_SIZES[url] = self.size
+
+    def _probe_size(self) -> int:
+        resp = self.session.get(self.url, headers={**self.headers, "Range": "bytes=0-0"},
+                                timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        self.requests += 1
+        content_range = resp.headers.get("Content-Range", "")
+        if resp.status_code != 206 or "/" not in content_range:
+            raise OSError(f"服务器不支持 Range 请求：{self.url}")
+        return int(content_range.rsplit("/", 1)[1])
+
+    def _fetch(self, start: int) -> bytes:
+        """从 start 开始拉一块数据并放进缓存"""
+        size = self._next_size if self._last_end == start else BLOCK_SIZE
+        end = min(start + size, self.size) - 1
+        resp = self.session.get(self.url, headers={**self.headers, "Range": f"bytes={start}-{end}"},
+                                timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        data = resp.content
+        self.requests += 1
+        self.bytes_fetched += len(data)
+
+        self._next_size = min(size * 2, MAX_BLOCK_SIZE)
+        self._last_end = start + len(data)
+        self._blocks[start] = data
+        while len(self._blocks) > CACHE_BLOCKS:
+            self._blocks.popitem(last=False)
+        return data
+
+    def _block_at(self, offset: int) -> tuple[int, bytes]:
+        for start, data in reversed(self._blocks.items()):
+            if start <= offset < start + len(data):
+                self._blocks.move_to_end(start)
+                return start, data
+        return offset, self._fetch(offset)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self.pos
+        size = min(size, self.size - self.pos)
+        chunks = []
+        while size > 0:
+            start, data = self._block_at(self.pos)
+            chunk = data[self.pos - start:self.pos - start + size]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.pos += len(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.pos = max(0, min(offset, self.size))
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def resolve_url(page_url: str) -> str:
+    """
+    用 yt-dlp 把网页地址解析成视频流直链（只要视频流，优先 mp4），
+    直链需要的请求头记下来，之后 HttpRangeFile 打开该直链时自动带上
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        "format": "bestvideo[ext=mp4]/bestvideo/best",
+        "quiet": True,
+        "no_warnings": True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(page_url, download=False)
+    formats = info.get("requested_formats") or [info]
+    fmt = formats[0]
+    _URL_HEADERS[fmt["url"]] = fmt.get("http_headers") or info.get("http_headers") or {}
+    return fmt["url"]
+
+
+def open_container(path: str, video_only: bool = False):
+    """
+    打开本地文件或 HTTP(S) URL，返回 PyAV 容器
+    video_only=True 时把非视频流设为丢弃，远程读取时这些流的数据不会被拉取
+    """
+    if is_url(path):
+        container = av.open(HttpRangeFile(path))
+    else:
+        container = av.open(path)
+    if video_only:
+        for stream in container.streams:
+            if stream.type != "video":
+                try:
+                    stream.discard = av.stream.Discard.all
+                except AttributeError:                 # 旧版 PyAV 没有 discard，只是多读些数据
+                    pass
+    return container
+
+
+def source_size(path: str) -> int:
+    """本地文件大小；URL 优先用之前打开时记下的大小，没打开过才发一次 Range 探测"""
+    if not is_url(path):
+        return os.path.getsize(path)
+    if path not in _URL_SIZES:
+        HttpRangeFile(path).close()
+    return _URL_SIZES[path]
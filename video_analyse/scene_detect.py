@@ -4,13 +4,26 @@
   1. 用 PyAV 遍历视频 packet，不完整解码，只读包大小
   2. 包大小突然变大 → 场景切换候选帧
   3. 对候选帧进行完整解码，截图保存
+     - seek：每个候选帧单独 seek 到前一个关键帧再向后解码
+     - sequential：候选帧按时间排序，只打开一次文件顺序前进，
+       只解码包含候选帧的 GOP，其余 GOP 只拆包跳过
 """
 
 import av
 import cv2
+import glob
+import json
 import os
+import queue
 import sys
+import threading
+import time
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from packet_index import get_packet_table, packet_times, table_duration
+from remote_source import is_url, open_container, register_url_headers, resolve_url, source_size, url_headers
 
 # ── 配置 ──────────────────────────────────────────────────────────────────────
 OUTPUT_DIR = r"d:\YouTube\video_analyse\temp\Capture"
@@ -20,17 +33,158 @@ SIZE_RATIO_THRESHOLD = 9.0
 
 # 相邻两次场景切换的最小间隔（秒），防止同一场景重复截图
 MIN_INTERVAL_SEC = 1.0
+
+# 像素域校验（--verify）：比较候选时间点前后两帧的缩略图，任一差异达到阈值才算真实切换
+VERIFY_THUMB_SIZE = (64, 36)        # 缩略图尺寸（宽, 高）
+VERIFY_HIST_THRESHOLD = 0.25        # 颜色直方图距离（0~1）
+VERIFY_DIFF_THRESHOLD = 30.0        # 平均像素差（0~255）
+
+# 批量模式识别的视频扩展名
+VIDEO_EXTENSIONS = {".mp4", ".mkv", ".webm", ".mov", ".m4v", ".avi", ".flv", ".ts"}
 # ─────────────────────────────────────────────────────────────────────────────
 
 
-def collect_candidate_pts(video_path: str, ratio: float) -> list[dict]:
-    """第一遍：只读 packet 大小，找候选 pts（不解码像素）"""
-    container = av.open(video_path)
+def rolling_baseline(sizes: np.ndarray) -> np.ndarray:
+    """
+    每个包的基准 = 前 5 个包的平均大小（不含当前包；第 5 个包起算，不足 5 个时取已有的）
+    前 4 个包数据不足，基准记为 0（不参与判定）
+    """
+    n = len(sizes)
+    baseline = np.zeros(n)
+    if n < 5:
+        return baseline
+    # 前缀和求窗口和：窗口为 sizes[max(0, i-5):i]，整数求和无误差
+    idx = np.arange(n)
+    lo = np.maximum(idx - 5, 0)
+    csum = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))
+    baseline[4:] = (csum[4:n] - csum[lo[4:]]) / (idx[4:] - lo[4:])
+    return baseline
+
+
+def ratio_hits(sizes: np.ndarray, baseline: np.ndarray, ratio: float) -> np.ndarray:
+    """包大小超过 基准 × 倍数 的包下标（前5帧数据不足，无法计算基准，排除）"""
+    hits = np.flatnonzero(sizes > baseline * ratio)
+    return hits[hits >= 4]
+
+
+def dedup_by_interval(hits: np.ndarray, times: np.ndarray, interval: float) -> list[int]:
+    """按最小间隔贪心去重：距上一个入选帧不足 interval 秒的命中丢弃"""
+    kept = []
+    last_candidate_time = -interval
+    for i in hits.tolist():
+        current_time = float(times[i])
+        if current_time - last_candidate_time >= interval:
+            kept.append(i)
+            last_candidate_time = current_time
+    return kept
+
+
+def detect_candidates(table: dict, ratio: float, interval: float) -> list[dict]:
+    """
+    向量化检测：一次性算出整段的滑动基准和突增倍数，结果与逐包循环完全一致
+      - 最小间隔去重只在命中的少量包上做贪心扫描
+      - P/B 中位数启发式只对最终入选的候选帧计算
+    """
+    sizes = table["size"]
+    times = packet_times(table)
+    baseline = rolling_baseline(sizes)
+
+    candidates = []
+    for i in dedup_by_interval(ratio_hits(sizes, baseline, ratio), times, interval):
+        size = int(sizes[i])
+        if table["key"][i]:
+            ftype = "I"
+        else:
+            median = np.median(sizes[max(0, i - 20):i])
+            ftype = "P" if size > median * 0.5 else "B"
+        base = float(baseline[i])
+        candidates.append({
+            "pts":      int(table["pts"][i]),
+            "time":     float(times[i]),
+            "ftype":    ftype,
+            "size":     size,
+            "baseline": base,
+            "ratio":    size / base,
+        })
+    return candidates
+
+
+def sweep_candidates(table: dict, thresholds: list[float], intervals: list[float]) -> list[dict]:
+    """
+    阈值 × 间隔网格扫描：基准只算一次，每个阈值做一次向量化比较，
+    每个间隔只在命中的包上去重；全程不解码像素
+    返回每个组合的 {threshold, interval, count, times}
+    """
+    sizes = table["size"]
+    times = packet_times(table)
+    baseline = rolling_baseline(sizes)
+
+    results = []
+    for threshold in thresholds:
+        hits = ratio_hits(sizes, baseline, threshold)
+        for interval in intervals:
+            kept = dedup_by_interval(hits, times, interval)
+            results.append({
+                "threshold": threshold,
+                "interval":  interval,
+                "count":     len(kept),
+                "times":     [round(float(times[i]), 3) for i in kept],
+            })
+    return results
+
+
+def print_sweep_table(results: list[dict], preview: int = 8) -> None:
+    """打印扫描结果表：每个组合一行，时间戳只预览前几个"""
+    print(f"  {'阈值':<8} {'间隔(s)':<8} {'候选数':<8} 时间戳(s)")
+    print("  " + "-" * 70)
+    for r in results:
+        shown = ", ".join(f"{t:.2f}" for t in r["times"][:preview])
+        more = f" ...（共 {r['count']} 个）" if r["count"] > preview else ""
+        print(f"  {r['threshold']:<8g} {r['interval']:<8g} {r['count']:<8} {shown}{more}")
+
+
+def collect_candidate_pts(video_path: str, ratio: float, interval: float | None = None,
+                          engine: str = "numpy", use_cache: bool = True, parts: int = 1,
+                          stats: dict | None = None) -> list[dict]:
+    """
+    第一遍：只读 packet 大小，找候选 pts（不解码像素）
+    stats 不为 None 时顺带填入 duration（秒），吞吐量统计直接复用，不必再打开一次视频
+    engine:
+      numpy  - 先拆包收集成数组，再向量化检测（默认，第一遍基本等于纯拆包速度）
+               包索引会缓存到侧车文件，再次运行直接内存映射读取，不再拆包
+               parts > 1 时按关键帧分段多进程拆包
+      python - 原始逐包循环，每包算一次中位数/均值，保留用于对比结果和耗时
+    """
+    if interval is None:
+        interval = MIN_INTERVAL_SEC
+
+    t0 = time.perf_counter()
+    if engine == "python":
+        candidates = _collect_candidates_python(video_path, ratio, interval, stats)
+        print(f"  逐包检测耗时 {time.perf_counter() - t0:.2f}s")
+    else:
+        table = get_packet_table(video_path, use_cache, parts)
+        t1 = time.perf_counter()
+        candidates = detect_candidates(table, ratio, interval)
+        t2 = time.perf_counter()
+        if stats is not None:
+            stats["duration"] = table_duration(table)
+        print(f"  读取 {len(table['size'])} 个包耗时 {t1 - t0:.2f}s，向量化检测耗时 {t2 - t1:.3f}s")
+    print(f"  找到 {len(candidates)} 个候选帧")
+    return candidates
+
+
+def _collect_candidates_python(video_path: str, ratio: float, interval: float,
+                               stats: dict | None = None) -> list[dict]:
+    """逐包循环版检测（原始实现）"""
+    container = open_container(video_path, video_only=True)
+    if stats is not None:
+        stats["duration"] = float(container.duration) / av.time_base if container.duration else 0.0
     stream = container.streams.video[0]
 
     candidates = []
     sizes = []                              # 滑动窗口：记录历史包大小，用于计算基准
-    last_candidate_time = -MIN_INTERVAL_SEC
+    last_candidate_time = -interval
 
     # demux 只拆包，不解码：拿到的是压缩数据，读取代价极小
     for packet in container.demux(stream):
@@ -60,7 +214,7 @@ def collect_candidate_pts(video_path: str, ratio: float) -> list[dict]:
         current_time = float(packet.pts * stream.time_base) if packet.pts else 0.0
 
         if (packet.size > baseline * ratio                              # 突增倍数超过阈值
-                and current_time - last_candidate_time >= MIN_INTERVAL_SEC):  # 距上次够远
+                and current_time - last_candidate_time >= interval):  # 距上次够远
             candidates.append({
                 "pts":      packet.pts,       # 用于第二遍精确定位
                 "time":     current_time,
@@ -72,15 +226,179 @@ def collect_candidate_pts(video_path: str, ratio: float) -> list[dict]:
             last_candidate_time = current_time
 
     container.close()
-    print(f"  找到 {len(candidates)} 个候选帧")
     return candidates
 
 
-def decode_frame_by_seek(video_path: str, target_time: float) -> tuple:
-    """seek 到目标时间附近的关键帧，向后解码直到找到目标时间的帧"""
-    container = av.open(video_path)
+class StreamingDetector:
+    """
+    逐包增量检测（直播 / 边下边分析用）：只保留最近 20 个包大小的环形缓冲，
+    每来一个包推进一次状态，结果与 detect_candidates 对整段数组的检测完全一致
+    """
+
+    def __init__(self, ratio: float, interval: float):
+        self.ratio = ratio
+        self.interval = interval
+        self.recent = deque(maxlen=20)              # 当前包之前最近 20 个包的大小
+        self.count = 0                              # 已处理的包数
+        self.last_candidate_time = -interval
+
+    def push(self, size: int, pts: int, current_time: float, is_keyframe: bool) -> dict | None:
+        """送入一个非空包，命中时返回候选帧字典，否则返回 None"""
+        recent = self.recent
+        candidate = None
+        if self.count >= 4:                         # 前5帧数据不足，无法计算基准
+            window = list(recent)[-5:]
+            baseline = sum(window) / len(window)
+            if size > baseline * self.ratio and current_time - self.last_candidate_time >= self.interval:
+                if is_keyframe:
+                    ftype = "I"
+                else:
+                    ftype = "P" if size > np.median(recent) * 0.5 else "B"
+                candidate = {
+                    "pts":      pts,
+                    "time":     current_time,
+                    "ftype":    ftype,
+                    "size":     size,
+                    "baseline": baseline,
+                    "ratio":    size / baseline,
+                }
+                self.last_candidate_time = current_time
+        recent.append(size)
+        self.count += 1
+        return candidate
+
+
+class TailReader:
+    """
+    给 PyAV 用的只读流：读到当前末尾时不立即返回 EOF，而是轮询等待文件继续增长，
+    连续 idle_timeout 秒没有新数据才算结束；用于分析 yt-dlp 正在写入的文件
+    不提供 seek，PyAV 会按不可 seek 的流式输入处理（MKV / WebM / 分片 MP4 / TS 均可，
+    moov 在文件末尾的普通 MP4 需要等下载完成）
+    """
+
+    def __init__(self, path: str, idle_timeout: float = 30.0, poll: float = 0.5):
+        self.file = open(path, "rb")
+        self.idle_timeout = idle_timeout
+        self.poll = poll
+
+    def read(self, size: int = -1) -> bytes:
+        idle_since = time.monotonic()
+        while True:
+            data = self.file.read(size)
+            if data:
+                return data
+            if time.monotonic() - idle_since >= self.idle_timeout:
+                return b""
+            time.sleep(self.poll)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _PipeReader:
+    """stdin / 管道：只暴露 read，让 PyAV 按不可 seek 的流读取"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def read(self, size: int = -1) -> bytes:
+        return self.raw.read(size)
+
+    def close(self) -> None:
+        pass
+
+
+def stream_detect(source: str, output_dir: str, ratio: float, interval: float,
+                  idle_timeout: float = 30.0, verify: bool = False, max_width: int | None = None,
+                  threads: int = 1, input_format: str | None = None, **writer_opts) -> tuple[int, int]:
+    """
+    流式检测 + 截图：source 为正在增长的文件路径，或 "-" 表示从 stdin / 管道读取
+    - 拆包的同时用 StreamingDetector 增量检测，命中立即打印
+    - 当前 GOP 的压缩包暂存着，下一个关键帧到达（GOP 结束）时解码截图，
+      截图最多比数据到达晚一个 GOP
+    返回 (候选数, 截图数)
+    """
+    reader = _PipeReader(sys.stdin.buffer) if source == "-" else TailReader(source, idle_timeout)
+    container = av.open(reader, mode="r", format=input_format)
     stream = container.streams.video[0]
-    time_base = float(stream.time_base)
+    if threads != 1:
+        stream.thread_type = "AUTO"
+        stream.codec_context.thread_count = threads
+    time_base = stream.time_base
+    detector = StreamingDetector(ratio, interval)
+
+    found = rejected = 0
+    pending = []
+
+    def emit(gop: list, gop_end: float, prev_gop: list):
+        nonlocal pending, rejected
+        ready = [c for c in pending if c["time"] < gop_end]
+        pending = pending[len(ready):]
+        if not ready:
+            return
+        for c, frame, actual_time, thumbs in capture_gop(stream, gop, ready, verify, prev_gop):
+            if verify and not is_real_cut(thumbs):
+                rejected += 1
+                continue
+            writer.put(c, frame, actual_time)
+
+    try:
+        with CaptureWriter(output_dir, max_width=max_width, **writer_opts) as writer:
+            gop, prev_gop = [], []
+            for packet in container.demux(stream):
+                if packet.size == 0:
+                    continue
+                if packet.is_keyframe and gop and packet.pts is not None:
+                    emit(gop, float(packet.pts * time_base), prev_gop)
+                    prev_gop = gop if verify else []
+                    gop = []
+                gop.append(packet)
+
+                current_time = float(packet.pts * time_base) if packet.pts else 0.0
+                c = detector.push(packet.size, packet.pts or 0, current_time, packet.is_keyframe)
+                if c is not None:
+                    found += 1
+                    print(f"  [候选] {c['time']:.2f}s  {c['ftype']}帧 {c['ratio']:.1f}x")
+                    pending.append(c)
+            emit(gop, float("inf"), prev_gop)
+    finally:
+        container.close()
+        reader.close()
+    if verify:
+        print(f"  像素域校验过滤掉 {rejected}/{found} 个候选帧")
+    return found, writer.saved
+
+
+def open_video(video_path: str, threads: int = 1):
+    """
+    打开视频，返回 (container, 视频流)
+    threads != 1 时开启解码器多线程（帧级 + 片级），0 表示由 FFmpeg 按 CPU 核数自动决定
+    """
+    container = open_container(video_path)
+    stream = container.streams.video[0]
+    if threads != 1:
+        stream.thread_type = "AUTO"
+        stream.codec_context.thread_count = threads
+    return container, stream
+
+
+def frame_to_image(frame, max_width: int | None = None):
+    """
+    解码帧 → BGR ndarray（cv2 可直接编码）
+    指定 max_width 且帧更宽时，在 PyAV 的 reformat（swscale）里一步完成缩放和色彩转换，
+    不会先生成整幅分辨率的 BGR 数组：4K 帧约 24MB，缩到 1280 宽只有约 2.6MB
+    """
+    if max_width and frame.width > max_width:
+        height = max(2, round(frame.height * max_width / frame.width / 2) * 2)
+        return frame.to_ndarray(width=max_width, height=height, format="bgr24", interpolation="AREA")
+    return frame.to_ndarray(format="bgr24")
+
+
+def decode_frame_by_seek(video_path: str, target_time: float,
+                         max_width: int | None = None, threads: int = 1) -> tuple:
+    """seek 到目标时间附近的关键帧，向后解码直到找到目标时间的帧"""
+    container, stream = open_video(video_path, threads)
+    time_base = stream.time_base
     try:
         target_us = int(target_time * 1_000_000)  # 转换为微秒（PyAV seek 单位）
 
@@ -95,10 +413,10 @@ def decode_frame_by_seek(video_path: str, target_time: float) -> tuple:
             for frame in packet.decode():          # 完整解码，得到原始像素
                 if frame.pts is None:
                     continue
-                frame_time = frame.pts * time_base
+                frame_time = float(frame.pts * time_base)
                 # 找到第一个到达目标时间的帧就返回，不继续解码
                 if frame_time >= target_time - 0.5:
-                    return frame.to_ndarray(format="bgr24"), frame_time
+                    return frame_to_image(frame, max_width), frame_time
     except Exception:
         pass
     finally:
@@ -106,20 +424,422 @@ def decode_frame_by_seek(video_path: str, target_time: float) -> tuple:
     return None, None
 
 
-def save_frame_at_pts(video_path: str, candidates: list[dict], output_dir: str):
+def _decode_gop(stream, packets: list):
+    """从关键帧开始解码一个 GOP 的全部包，按显示顺序逐帧产出（含解码器缓冲的尾帧）"""
+    codec = stream.codec_context
+    codec.flush_buffers()                          # 清掉上一个 GOP 的 flush 状态
+    for packet in packets:
+        yield from codec.decode(packet)
+    yield from codec.decode(None)                  # 送入空包，取出 B 帧重排缓冲里的剩余帧
+
+
+def thumbnail(frame) -> np.ndarray:
+    """缩到 VERIFY_THUMB_SIZE 的 RGB 小图，在 swscale 里一步完成，用于像素域校验"""
+    width, height = VERIFY_THUMB_SIZE
+    return frame.to_ndarray(width=width, height=height, format="rgb24")
+
+
+def frame_change(a: np.ndarray, b: np.ndarray) -> tuple[float, float]:
+    """
+    两张缩略图的差异，返回 (颜色直方图距离 0~1, 平均像素差 0~255)
+    直方图：每通道 16 档，三通道一次 bincount；距离为归一化直方图 L1 距离的一半
+    """
+    offsets = np.array([0, 16, 32])
+    ha = np.bincount(((a >> 4).reshape(-1, 3) + offsets).ravel(), minlength=48) / (a.size / 3)
+    hb = np.bincount(((b >> 4).reshape(-1, 3) + offsets).ravel(), minlength=48) / (b.size / 3)
+    hist_dist = float(np.abs(ha - hb).sum()) / 6
+    pixel_diff = float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean())
+    return hist_dist, pixel_diff
+
+
+def is_real_cut(probe: tuple | None) -> bool:
+    """切换前后两张缩略图差异够大才算真实切换；取不到前后帧时无法判断，保留"""
+    if probe is None or probe[0] is None or probe[1] is None:
+        return True
+    hist_dist, pixel_diff = frame_change(*probe)
+    return hist_dist >= VERIFY_HIST_THRESHOLD or pixel_diff >= VERIFY_DIFF_THRESHOLD
+
+
+def capture_gop(stream, gop: list, cands: list[dict], probe: bool = False, prev_gop: list | None = None):
+    """
+    解码一个 GOP（gop[0] 为关键帧包），为落在其中的候选帧（按时间排序）逐个取帧，
+    产出 (候选, 帧, 帧时间, 前后缩略图)；取帧规则见 iter_frames_sequential
+    """
+    if not gop:
+        for c in cands:
+            yield c, None, None, None
+        return
+    # 时间一律用 Fraction 精确相乘后再转 float，与 packet_times 算候选时间的舍入一致；
+    # 先把 time_base 转成 float 再乘会有误差（19400 * 0.001 = 19.400000000000002），
+    # 正好落在关键帧上的候选帧会被错判到上一个 GOP
+    time_base = stream.time_base
+    before_thumb = None
+    if (probe and prev_gop and gop[0].pts is not None
+            and cands[0]["time"] <= float(gop[0].pts * time_base)):
+        last = None
+        try:
+            for frame in _decode_gop(stream, prev_gop):
+                if frame.pts is not None and float(frame.pts * time_base) < cands[0]["time"]:
+                    last = frame
+        except Exception:
+            pass
+        before_thumb = thumbnail(last) if last is not None else None
+
+    frames = _decode_gop(stream, gop)
+    pushback = None                                # probe 时多读出的 "之后" 帧，留给下一个候选帧
+
+    def next_frame():
+        nonlocal pushback
+        if pushback is not None:
+            frame, pushback = pushback, None
+            return frame
+        return next(frames, None)
+
+    for c in cands:
+        found = None
+        before = after = None
+        try:
+            while (frame := next_frame()) is not None:
+                if frame.pts is None:
+                    continue
+                frame_time = float(frame.pts * time_base)
+                if found is None and frame_time >= c["time"] - 0.5:
+                    found = (frame, frame_time)
+                    if not probe:
+                        break
+                if probe:
+                    if frame_time < c["time"]:
+                        before = frame
+                    else:
+                        after = pushback = frame
+                        break
+        except Exception:
+            frames = iter(())                      # 这个 GOP 解码出错，剩下的候选帧都算失败
+        thumbs = None
+        if probe:
+            thumbs = (thumbnail(before) if before is not None else before_thumb,
+                      thumbnail(after) if after is not None else None)
+            before_thumb = None
+        if found is None:
+            yield c, None, None, thumbs
+        else:
+            yield c, found[0], found[1], thumbs
+
+
+def iter_frames_sequential(video_path: str, candidates: list[dict], seek_first: bool = False,
+                           threads: int = 1, probe: bool = False):
+    """
+    顺序截图：候选帧按时间排序后只打开一次文件向前走，逐个产出 (候选, 帧, 帧时间, 前后缩略图)
+    - demux 时把当前 GOP 的压缩包暂存起来（只拆包，代价极小）
+    - 遇到下一个关键帧时，若有候选帧落在刚结束的 GOP 内，才把这个 GOP 整段解码一次
+    - 不含候选帧的 GOP 直接丢弃，不解码
+    - seek_first=True 时先 seek 到第一个候选帧前的关键帧，跳过前面的部分（分段并行时用）；
+      probe=True 时再多退一个关键帧，段内第一个候选帧也能取到 "之前" 的画面
+    - probe=True 时顺带取出候选时间点之前最后一帧、之后第一帧的缩略图 (before, after)，
+      供 is_real_cut 校验；候选帧就在 GOP 开头时，"之前" 那帧在上一个 GOP 里，
+      这时把上一个 GOP（压缩包一直暂存着）也解码一次取最后一帧
+      probe=False 时第四项为 None
+    取帧规则与 decode_frame_by_seek 一致：从 GOP 的关键帧开始，第一个到达 目标时间-0.5s 的帧
+    解码失败时帧为 None
+    """
+    pending = sorted(candidates, key=lambda c: c["time"])
+    if not pending:
+        return
+
+    container, stream = open_video(video_path, threads)
+    time_base = stream.time_base                   # Fraction，舍入方式见 capture_gop
+    idx = 0
+    if seek_first:
+        container.seek(int(pending[0]["time"] * 1_000_000), any_frame=False)
+        if probe:
+            # 第一个候选帧可能正好在关键帧上，它 "之前" 那帧在上一个 GOP 里：
+            # 再往前退一个关键帧，让 prev_gop 在取第一个候选帧时已经就绪（已在开头则原地重新 seek，
+            # 探测时读走的包要重新读到）
+            first = next((p for p in container.demux(stream) if p.size and p.pts is not None), None)
+            if first is not None:
+                # 有 B 帧时关键帧的 dts 早于 pts，MP4 按 dts 定位，取两者较小的再往前退
+                key_ts = min(first.pts, first.dts if first.dts is not None else first.pts)
+                at_start = key_ts <= (stream.start_time or 0)
+                container.seek(first.pts if at_start else key_ts - 1, any_frame=False, backward=True, stream=stream)
+
+    def flush(gop: list, gop_end: float, prev_gop: list):
+        """取出所有目标时间早于 gop_end 的候选帧，在这个 GOP 内解码定位"""
+        nonlocal idx
+        start = idx
+        while idx < len(pending) and pending[idx]["time"] < gop_end:
+            idx += 1
+        yield from capture_gop(stream, gop, pending[start:idx], probe, prev_gop)
+
+    try:
+        gop, prev_gop = [], []
+        for packet in container.demux(stream):
+            if packet.size == 0:
+                continue
+            if packet.is_keyframe and gop and packet.pts is not None:
+                gop_end = float(packet.pts * time_base)
+                if pending[idx]["time"] < gop_end:
+                    yield from flush(gop, gop_end, prev_gop)
+                    if idx >= len(pending):
+                        return                     # 候选帧已全部处理，不必读到文件末尾
+                prev_gop = gop if probe else []
+                gop = []
+            gop.append(packet)
+        yield from flush(gop, float("inf"), prev_gop)  # 最后一个 GOP
+    finally:
+        container.close()
+
+
+def _write_capture(c: dict, img, actual_time, output_dir: str,
+                   image_format: str = "jpg", quality: int | None = None) -> bool:
+    """保存一张截图并打印结果，成功返回 True"""
+    if img is None:
+        print(f"  [跳过] {c['time']:.2f}s 解码失败")
+        return False
+    # 文件名带时间戳，方便对应回视频位置
+    filename = os.path.join(output_dir, f"scene_{actual_time:.2f}s.{image_format}")
+    params = []
+    if quality is not None:
+        params = [cv2.IMWRITE_WEBP_QUALITY if image_format == "webp" else cv2.IMWRITE_JPEG_QUALITY, quality]
+    cv2.imwrite(filename, img, params)
+    print(f"  [{c['ftype']}帧 {c['ratio']:.1f}x]  {os.path.basename(filename)}")
+    return True
+
+
+class CaptureWriter:
+    """
+    截图写出器
+      writers=0：在调用线程里同步 转换 + 编码 + 写盘（原始行为）
+      writers>0：解码线程只把帧放进有界队列，由 writers 个线程并行做 缩放转换 + 编码 + 写盘，
+                 与解码重叠；队列满时 put 阻塞（背压），内存里最多积压 queue_size 帧
+    放入的可以是 av.VideoFrame（在写线程里转换）或已转换好的 ndarray
+    """
+
+    def __init__(self, output_dir: str, writers: int = 0, max_width: int | None = None,
+                 image_format: str = "jpg", quality: int | None = None, queue_size: int | None = None):
+        self.output_dir = output_dir
+        self.max_width = max_width
+        self.image_format = image_format
+        self.quality = quality
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size or writers * 2)
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(writers)]
+        for t in self._threads:
+            t.start()
+
+    def put(self, c: dict, frame, actual_time) -> None:
+        if self._threads:
+            self._queue.put((c, frame, actual_time))
+        else:
+            self._write(c, frame, actual_time)
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._write(*item)
+
+    def _write(self, c: dict, frame, actual_time) -> None:
+        try:
+            img = frame if frame is None or isinstance(frame, np.ndarray) else frame_to_image(frame, self.max_width)
+            ok = _write_capture(c, img, actual_time, self.output_dir, self.image_format, self.quality)
+        except Exception as e:                      # 单张失败不能让写线程退出，否则解码线程会卡在满队列上
+            print(f"  [跳过] {c['time']:.2f}s 写入失败：{e}")
+            ok = False
+        with self._lock:
+            self.saved += ok
+
+
+def save_frame_at_pts(video_path: str, candidates: list[dict], output_dir: str,
+                      max_width: int | None = None, threads: int = 1, **writer_opts):
     """第二遍截图：对每个候选帧 seek 解码并保存图片"""
+    with CaptureWriter(output_dir, max_width=max_width, **writer_opts) as writer:
+        for c in candidates:
+            img, actual_time = decode_frame_by_seek(video_path, c["time"], max_width, threads)
+            writer.put(c, img, actual_time)
+    return writer.saved
+
+
+def save_frames_sequential(video_path: str, candidates: list[dict], output_dir: str,
+                           seek_first: bool = False, max_width: int | None = None, threads: int = 1,
+                           verify: bool = False, **writer_opts):
+    """
+    第二遍截图（顺序模式）：一次顺序遍历，每个候选帧最多解码一个 GOP
+    verify=True 时先用切换前后两帧的缩略图做像素域校验，未通过的候选帧（码率尖峰、
+    周期性关键帧等）不做整幅转换、不编码、不落盘
+    writer_opts 传给 CaptureWriter（writers / image_format / quality / queue_size）
+    """
+    rejected = 0
+    with CaptureWriter(output_dir, max_width=max_width, **writer_opts) as writer:
+        frames = iter_frames_sequential(video_path, candidates, seek_first, threads, probe=verify)
+        for c, frame, actual_time, thumbs in frames:
+            if verify and not is_real_cut(thumbs):
+                hist_dist, pixel_diff = frame_change(*thumbs)
+                print(f"  [过滤] {c['time']:.2f}s 前后画面相近（直方图 {hist_dist:.2f}，像素差 {pixel_diff:.1f}）")
+                rejected += 1
+                continue
+            if frame is None:
+                # 顺序解码没取到（如开放 GOP 的前导帧），退回单独 seek
+                frame, actual_time = decode_frame_by_seek(video_path, c["time"], max_width, threads)
+            writer.put(c, frame, actual_time)
+    if verify:
+        print(f"  像素域校验过滤掉 {rejected}/{len(candidates)} 个候选帧")
+    return writer.saved
+
+
+def save_frames_parallel(video_path: str, candidates: list[dict], output_dir: str, parts: int,
+                         **capture_opts) -> int:
+    """
+    第二遍截图（分段并行）：候选帧按时间顺序均分成 parts 段，每段一个进程各自 seek 后顺序截图
+    按候选帧数量而不是时长切分，各进程解码量接近
+    """
+    ordered = sorted(candidates, key=lambda c: c["time"])
+    size = -(-len(ordered) // parts)
+    chunks = [ordered[i:i + size] for i in range(0, len(ordered), size)]
+    with ProcessPoolExecutor(max_workers=len(chunks), initializer=register_url_headers,
+                             initargs=(url_headers(),)) as pool:
+        futures = [pool.submit(save_frames_sequential, video_path, chunk, output_dir,
+                               seek_first=True, **capture_opts)
+                   for chunk in chunks]
+        return sum(f.result() for f in futures)
+
+
+def process_video(video_path: str, output_dir: str, threshold: float, interval: float,
+                  engine: str = "numpy", use_cache: bool = True, capture: str = "sequential",
+                  parts: int = 1, max_width: int | None = None, threads: int = 1,
+                  writers: int = 0, image_format: str = "jpg", quality: int | None = None,
+                  verify: bool = False) -> dict:
+    """
+    单个视频完整流程：第一遍粗筛 + 第二遍截图，返回耗时统计
+    参数全部显式传入（不依赖全局变量），可直接作为进程池任务
+    parts > 1 时单个视频内部按关键帧分段多进程处理：
+      - 第一遍各段并行拆包，拼回完整的包大小数组后再统一检测，
+        跨段的滑动基准和最小间隔去重与整文件顺序处理完全一致
+      - 第二遍候选帧分段，各进程 seek 到自己的起点后顺序截图
+    max_width / threads：截图缩放到的最大宽度、解码线程数（见 frame_to_image / open_video）
+    writers / image_format / quality：截图编码写盘线程数、图片格式和质量（见 CaptureWriter）
+    verify：截图前做像素域校验，去掉误报的候选帧（需要顺序解码，seek 模式下自动改用 sequential）
+    """
+    t0 = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"视频：{video_path}")
+    print(f"阈值：{threshold}x  最小间隔：{interval}s")
+    print("第一遍：压缩域粗筛...")
+    source = {}
+    candidates = collect_candidate_pts(video_path, threshold, interval, engine=engine,
+                                       use_cache=use_cache, parts=parts, stats=source)
+
     saved = 0
-    for c in candidates:
-        img, actual_time = decode_frame_by_seek(video_path, c["time"])
-        if img is not None:
-            # 文件名带时间戳，方便对应回视频位置
-            filename = os.path.join(output_dir, f"scene_{actual_time:.2f}s.jpg")
-            cv2.imwrite(filename, img)
-            print(f"  [{c['ftype']}帧 {c['ratio']:.1f}x]  {os.path.basename(filename)}")
-            saved += 1
+    if not candidates:
+        print("未检测到场景切换，尝试降低 SIZE_RATIO_THRESHOLD 阈值后重试")
+    else:
+        print(f"\n第二遍：解码截图（{capture}）...")
+        capture_opts = {"max_width": max_width, "threads": threads, "writers": writers,
+                        "image_format": image_format, "quality": quality}
+        if parts > 1:
+            saved = save_frames_parallel(video_path, candidates, output_dir, parts, verify=verify, **capture_opts)
+        elif capture == "seek" and not verify:
+            saved = save_frame_at_pts(video_path, candidates, output_dir, **capture_opts)
         else:
-            print(f"  [跳过] {c['time']:.2f}s 解码失败")
-    return saved
+            saved = save_frames_sequential(video_path, candidates, output_dir, verify=verify, **capture_opts)
+        print(f"\n完成！共保存 {saved} 张截图到：{output_dir}")
+
+    return {
+        "video":      video_path,
+        "candidates": len(candidates),
+        "saved":      saved,
+        "seconds":    time.perf_counter() - t0,
+        "duration":   source["duration"],
+        "bytes":      source_size(video_path),      # URL 用第一遍探测时记下的大小，不再发请求
+    }
+
+
+def find_videos(pattern: str) -> list[str]:
+    """目录 → 其中所有视频文件（不递归）；否则按 glob 模式匹配（支持 **）"""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(p for p in paths
+                  if os.path.isfile(p) and os.path.splitext(p)[1].lower() in VIDEO_EXTENSIONS)
+
+
+def _print_throughput(stat: dict) -> None:
+    secs = max(stat["seconds"], 1e-6)
+    print(f"  {os.path.basename(stat['video']):<40} 候选 {stat['candidates']:<5} 截图 {stat['saved']:<5} "
+          f"耗时 {stat['seconds']:7.1f}s  {stat['duration'] / secs:6.1f}x 实时  "
+          f"{stat['bytes'] / secs / 1024 / 1024:7.1f} MB/s")
+
+
+def run_batch(videos: list[str], output_root: str, workers: int, **options) -> list[dict]:
+    """
+    多视频并行：每个视频一个进程池任务，截图写到 output_root/<视频文件名>/ 子目录
+    结束后打印每个视频和整体的吞吐量
+    """
+    print(f"批量处理 {len(videos)} 个视频，{workers} 个进程")
+    # 子目录用视频文件名（不含扩展名）；同名不同扩展名时带上扩展名区分，
+    # ** 递归匹配时不同目录下的同名文件再加序号，不让两个进程往同一个目录里写
+    stems = [os.path.splitext(os.path.basename(v)) for v in videos]
+    dup = {stem for stem, _ in stems if sum(1 for s, _ in stems if s == stem) > 1}
+    subdirs, used = [], set()
+    for video, (stem, ext) in zip(videos, stems):
+        name = subdir = f"{stem}_{ext.lstrip('.')}" if stem in dup else stem
+        k = 2
+        while subdir.lower() in used:   # Windows 目录名不分大小写
+            subdir = f"{name}_{k}"
+            k += 1
+        used.add(subdir.lower())
+        if subdir != name:
+            print(f"  同名视频 {video} → {subdir}/")
+        subdirs.append(subdir)
+
+    t0 = time.perf_counter()
+    stats = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=register_url_headers,
+                             initargs=(url_headers(),)) as pool:
+        futures = {
+            pool.submit(process_video, video, os.path.join(output_root, subdir), **options): video
+            for video, subdir in zip(videos, subdirs)
+        }
+        for future in as_completed(futures):
+            try:
+                stats.append(future.result())
+            except Exception as e:
+                print(f"[失败] {futures[future]}: {e}")
+    wall = time.perf_counter() - t0
+
+    stats.sort(key=lambda st: st["video"])
+    print("\n" + "=" * 90)
+    print("批量处理汇总")
+    print("=" * 90)
+    for st in stats:
+        _print_throughput(st)
+    total_bytes = sum(st["bytes"] for st in stats)
+    total_duration = sum(st["duration"] for st in stats)
+    print("-" * 90)
+    print(f"  成功 {len(stats)}/{len(videos)} 个，总耗时 {wall:.1f}s，"
+          f"{total_duration / max(wall, 1e-6):.1f}x 实时，{total_bytes / max(wall, 1e-6) / 1024 / 1024:.1f} MB/s，"
+          f"共截图 {sum(st['saved'] for st in stats)} 张")
+    return stats
+
+
+def _float_list(text: str) -> list[float]:
+    """解析逗号分隔的数值列表，如 "3,5,7.5" """
+    return [float(v) for v in text.split(",") if v.strip()]
 
 
 def main():
@@ -127,33 +847,91 @@ def main():
 
     import argparse
     parser = argparse.ArgumentParser(description="压缩域场景切换检测")
-    parser.add_argument("--path",      type=str,   default=None, help="视频文件路径")
+    parser.add_argument("--path",      type=str,   default=None, help="视频文件路径，或 HTTP(S) 媒体直链（按 Range 按需读取，不整个下载）")
+    parser.add_argument("--ytdlp",     action="store_true", help="--path 是网页地址（YouTube / Patreon 等），先用 yt-dlp 解析出视频直链")
+    parser.add_argument("--batch",     type=str,   default=None, help="批量模式：视频目录或 glob 模式（如 \"d:/dl/**/*.mp4\"）")
+    parser.add_argument("--output",    type=str,   default=OUTPUT_DIR, help="截图输出目录，默认 OUTPUT_DIR")
+    parser.add_argument("--workers",   type=int,   default=os.cpu_count() or 1, help="批量模式的进程数，默认 CPU 核数")
+    parser.add_argument("--parts",     type=int,   default=1, help="单个视频按关键帧切成几段多进程处理，默认 1（不切分）")
     parser.add_argument("--threshold", type=float, default=SIZE_RATIO_THRESHOLD, help=f"包大小突增倍数阈值，默认 {SIZE_RATIO_THRESHOLD}")
     parser.add_argument("--interval",  type=float, default=MIN_INTERVAL_SEC,     help=f"相邻截图最小间隔秒数，默认 {MIN_INTERVAL_SEC}")
+    parser.add_argument("--engine",    choices=["numpy", "python"], default="numpy",
+                        help="第一遍检测引擎：numpy=拆包后向量化检测（默认），python=原始逐包循环（用于对比）")
+    parser.add_argument("--no-cache",  action="store_true", help="不读写包索引缓存，强制重新拆包")
+    parser.add_argument("--capture",   choices=["sequential", "seek"], default="sequential",
+                        help="截图方式：sequential=一次顺序遍历只解码含候选帧的 GOP（默认），seek=每帧单独 seek")
+    parser.add_argument("--max-width", type=int,   default=None, help="截图最大宽度（像素），超过时在解码输出阶段直接缩小，默认保持原分辨率")
+    parser.add_argument("--threads",   type=int,   default=1, help="截图解码线程数，0=按 CPU 核数自动，默认 1")
+    parser.add_argument("--writers",   type=int,   default=2, help="截图编码写盘线程数，与解码并行，0=在解码线程里同步写，默认 2")
+    parser.add_argument("--image-format", choices=["jpg", "webp"], default="jpg", help="截图格式，默认 jpg")
+    parser.add_argument("--quality",   type=int,   default=None, help="截图编码质量 1-100，默认用 OpenCV 的默认值")
+    parser.add_argument("--verify",    action="store_true", help="截图前用前后帧缩略图做像素域校验，过滤误报的场景切换")
+    parser.add_argument("--follow",    action="store_true",
+                        help="流式模式：--path 是仍在写入的文件（如 yt-dlp 下载中），边读边检测截图；--path - 从 stdin 读取")
+    parser.add_argument("--idle-timeout", type=float, default=30.0, help="--follow 时文件多少秒不再增长视为结束，默认 30")
+    parser.add_argument("--format",    type=str,   default=None, help="--follow 读 stdin 时的容器格式提示，如 matroska / mpegts")
+    parser.add_argument("--sweep",     action="store_true", help="只做阈值 × 间隔网格扫描，输出各组合的候选数和时间戳，不解码不截图")
+    parser.add_argument("--thresholds", type=_float_list, default=[3.0, 5.0, 7.0, 9.0, 12.0],
+                        help="--sweep 的阈值列表，逗号分隔，默认 3,5,7,9,12")
+    parser.add_argument("--intervals", type=_float_list, default=[0.5, 1.0, 2.0, 5.0],
+                        help="--sweep 的间隔列表（秒），逗号分隔，默认 0.5,1,2,5")
+    parser.add_argument("--json",      type=str,   default=None, help="--sweep 结果另存为 JSON 文件")
     args = parser.parse_args()
 
     video_path = args.path if args.path else ""
     MIN_INTERVAL_SEC = args.interval
+    options = {"engine": args.engine, "use_cache": not args.no_cache, "capture": args.capture,
+               "max_width": args.max_width, "threads": args.threads, "writers": max(0, args.writers),
+               "image_format": args.image_format, "quality": args.quality, "verify": args.verify}
+
+    if args.batch:
+        videos = find_videos(args.batch)
+        if not videos:
+            print(f"没有找到视频文件：{args.batch}")
+            sys.exit(1)
+        run_batch(videos, args.output, max(1, args.workers),
+                  threshold=args.threshold, interval=args.interval, **options)
+        return
 
-    if not os.path.exists(video_path):
-        print(f"视频文件不存在：{video_path}")
-        sys.exit(1)
+    if args.follow:
+        if video_path != "-" and not os.path.exists(video_path):
+            print(f"视频文件不存在：{video_path}")
+            sys.exit(1)
+        os.makedirs(args.output, exist_ok=True)
+        print(f"流式检测：{'stdin' if video_path == '-' else video_path}")
+        print(f"阈值：{args.threshold}x  最小间隔：{args.interval}s")
+        found, saved = stream_detect(
+            video_path, args.output, args.threshold, args.interval,
+            idle_timeout=args.idle_timeout, verify=args.verify, max_width=args.max_width,
+            threads=args.threads, input_format=args.format, writers=options["writers"],
+            image_format=args.image_format, quality=args.quality,
+        )
+        print(f"\n完成！共 {found} 个候选帧，保存 {saved} 张截图到：{args.output}")
+        return
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if args.ytdlp:
+        print(f"yt-dlp 解析直链：{video_path}")
+        video_path = resolve_url(video_path)
 
-    print(f"视频：{video_path}")
-    print(f"阈值：{args.threshold}x  最小间隔：{args.interval}s")
-    print("第一遍：压缩域粗筛...")
-    candidates = collect_candidate_pts(video_path, args.threshold)
+    if not is_url(video_path) and not os.path.exists(video_path):
+        print(f"视频文件不存在：{video_path}")
+        sys.exit(1)
 
-    if not candidates:
-        print("未检测到场景切换，尝试降低 SIZE_RATIO_THRESHOLD 阈值后重试")
+    if args.sweep:
+        print(f"视频：{video_path}")
+        print(f"网格扫描：阈值 {args.thresholds} × 间隔 {args.intervals}")
+        t0 = time.perf_counter()
+        table = get_packet_table(video_path, use_cache=not args.no_cache)
+        results = sweep_candidates(table, args.thresholds, args.intervals)
+        print(f"  {len(results)} 个组合，耗时 {time.perf_counter() - t0:.2f}s\n")
+        print_sweep_table(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"video": video_path, "results": results}, f, ensure_ascii=False, indent=2)
+            print(f"\n结果已保存到：{args.json}")
         return
 
-    print("\n第二遍：解码截图...")
-    saved = save_frame_at_pts(video_path, candidates, OUTPUT_DIR)
-
-    print(f"\n完成！共保存 {saved} 张截图到：{OUTPUT_DIR}")
+    process_video(video_path, args.output, args.threshold, args.interval, parts=max(1, args.parts), **options)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+"""
+回归检查：顺序截图（iter_frames_sequential）和 seek 截图（decode_frame_by_seek）对同一个候选帧必须取到同一帧。
+
+MKV / WebM 的 time_base 是 1/1000，用 float 的 time_base 相乘会有舍入误差（19400 * 0.001 = 19.400000000000002），
+正好落在关键帧上的候选帧曾被错判到上一个 GOP，截到切换前的画面。不给 --path 时自动生成一个
+30fps、切换点都是关键帧的 MKV 复现这个场景。
+
+用法:
+    python check_capture_modes.py                       # 用生成的 MKV 检查
+    python check_capture_modes.py --path a.mkv b.webm   # 检查指定文件
+不一致时逐条打印并以退出码 1 结束。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import av
+except ImportError:
+    print("错误: 请先安装 PyAV:  pip install av", file=sys.stderr)
+    sys.exit(1)
+
+# 截图模块在上一级目录（video_analyse/）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from scene_detect import collect_candidate_pts, decode_frame_by_seek, iter_frames_sequential
+
+# 生成的测试视频：每 SCENE_FRAMES 帧换一个静止画面，并强制为关键帧
+SCENE_FRAMES = 97
+SYNTHETIC_SECONDS = 40
+SYNTHETIC_FPS = 30
+
+
+def make_synthetic_mkv(path: str) -> None:
+    """生成 320x240 的 H.264 MKV：静止画面 + 切换点强制 I 帧，候选帧全部落在关键帧上"""
+    rng = np.random.default_rng(1)
+    with av.open(path, "w") as container:
+        stream = container.add_stream("libx264", rate=SYNTHETIC_FPS)
+        stream.width, stream.height, stream.pix_fmt = 320, 240, "yuv420p"
+        stream.options = {"g": "250", "bf": "2"}
+        for i in range(SYNTHETIC_FPS * SYNTHETIC_SECONDS):
+            if i % SCENE_FRAMES == 0:
+                blocks = rng.integers(0, 255, (15, 20, 3), dtype=np.uint8)
+                image = np.repeat(np.repeat(blocks, 16, 0), 16, 1)
+            frame = av.VideoFrame.from_ndarray(image, format="rgb24")
+            if i % SCENE_FRAMES == 0:
+                frame.pict_type = av.video.frame.PictureType.I
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def check_video(video_path: str, threshold: float, interval: float) -> int:
+    """返回取帧不一致的候选帧数；顺序模式没取到帧（会退回 seek）的不算"""
+    candidates = collect_candidate_pts(video_path, threshold, interval, use_cache=False)
+    mismatched = 0
+    for c, frame, seq_time, _ in iter_frames_sequential(video_path, candidates):
+        if frame is None:
+            continue
+        _, seek_time = decode_frame_by_seek(video_path, c["time"])
+        if seek_time is None or abs(seq_time - seek_time) > 1e-6:
+            mismatched += 1
+            seek_text = "解码失败" if seek_time is None else f"{seek_time:.3f}s"
+            print(f"  [不一致] 候选 {c['time']:.3f}s（{c['ftype']}帧）  顺序 {seq_time:.3f}s  seek {seek_text}")
+    print(f"  {len(candidates)} 个候选帧，不一致 {mismatched} 个")
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查顺序截图与 seek 截图取到的帧是否一致")
+    parser.add_argument("--path", nargs="+", help="视频文件，默认生成一个 MKV")
+    parser.add_argument("--threshold", type=float, default=9.0)
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = args.path
+        if not paths:
+            paths = [os.path.join(tmp, "synthetic.mkv")]
+            make_synthetic_mkv(paths[0])
+        for path in paths:
+            print(f"检查: {path}")
+            failed += check_video(path, args.threshold, args.interval)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,20 +7,53 @@
 
 用法:
     python frame_packet_size.py --path <视频文件路径>
+
+H.264 / HEVC 直接从包里的 slice header 读帧类型（见 ../bitstream.py），只拆包不解码；
+其它编码（或加 --decode）才逐包解码取 pict_type。
+
+首次运行会把每个包的大小 / 时间 / 帧类型写入包索引缓存（见 ../packet_index.py），
+之后同一文件（大小和修改时间不变）直接内存映射回放，不再拆包。
+
+采样间隔较大（≥ SEEK_MIN_INTERVAL 秒，或加 --seek）时改为跳读：每个采样点 seek 过去只读一个 GOP，
+耗时与采样数成正比而与文件长度无关；跳读只看部分包，不写缓存。
+
+--export <文件> 不逐帧打印，而是把全部帧按列导出（.npz，或需要 pandas + pyarrow 的 .parquet / .feather）：
+  帧表   index / pts / time / type / size / key / gop
+  GOP 表 每个 GOP 的 I 帧大小、P/B 帧数与总大小、P/B 大小分位数（全部向量化计算）
+Parquet / Feather 的 GOP 表写到同目录的 <文件名>.gops.<扩展名>。
 """
 
 import argparse
 import sys
+from collections import deque
 from pathlib import Path
 
+import numpy as np
+
 try:
     import av
 except ImportError:
     print("错误: 请先安装 PyAV:  pip install av", file=sys.stderr)
     sys.exit(1)
 
+# 包索引缓存 / 码流解析模块在上一级目录（video_analyse/）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bitstream import make_slice_type_parser
+from mp4_index import read_mp4_packet_table
+from packet_index import PICT_CODES, PICT_NAMES, load_packet_index, make_table, packet_times, save_packet_index
+
 _PICT_TYPE_MAP = {0: "NONE", 1: "I", 2: "P", 3: "B", 4: "S", 5: "SI", 6: "SP", 7: "BI"}
 
+# 采样间隔不小于该值（秒）且没有带帧类型的缓存时，自动改用跳读采样
+SEEK_MIN_INTERVAL = 30.0
+
+# 逐包解码时最多排队等多少个包的帧解出来（B 帧重排延迟通常只有几帧）
+DECODE_REORDER_MAX = 64
+
+# 导出 GOP 表时计算的 P/B 帧大小分位数
+EXPORT_PERCENTILES = (50, 90, 99)
+EXPORT_FORMATS = (".npz", ".parquet", ".feather")
+
 
 def flush_gop(gop_index: int, current_gop_header: tuple | None, pb_frames: list) -> int:
     """打印一个 GOP 的所有帧信息，返回更新后的 gop_index。"""
@@ -87,54 +120,340 @@ def print_video_info(
     print()
 
 
-def analyze_and_print(video_path: str, interval: float = 1.0) -> None:
+def _decode_rows(container, stream, columns: dict):
+    """
+    逐包解码取帧类型，产出 (帧类型, 时间, 包大小)；同时把各列记进 columns，供写包索引
+    有 B 帧时解码器先吐出的是更早的包的帧，所以同 _decode_gop_types 一样按帧 pts 把类型对回各个包：
+    包先排队，等对应 pts 的帧解出来再按包顺序产出
+    """
+    codec = stream.codec_context
+    codec.skip_frame = "DEFAULT"
+    pending = deque()          # (pts, size, is_keyframe)，按解包顺序
+    types = {}                 # 帧 pts → 帧类型
+
+    def ready(final: bool = False):
+        # 队首的帧迟迟解不出来（pts 对不上等）时不无限排队，超过 DECODE_REORDER_MAX 个包就按未知类型产出
+        while pending and (final or pending[0][0] in types or len(pending) > DECODE_REORDER_MAX):
+            pts, size, key = pending.popleft()
+            pict_type = types.pop(pts, None)
+            columns["size"].append(size)
+            columns["pts"].append(pts or 0)
+            columns["key"].append(key)
+            columns["pict"].append(PICT_CODES.get(pict_type, 0))
+            yield pict_type, float(pts * stream.time_base) if pts is not None else 0.0, size
+
+    for packet in container.demux(stream):
+        if packet.size == 0:
+            continue
+        pending.append((packet.pts, packet.size, packet.is_keyframe))
+        for frame in codec.decode(packet):
+            types[frame.pts] = _frame_type(frame)
+        yield from ready()
+
+    for frame in codec.decode(None):
+        types[frame.pts] = _frame_type(frame)
+    yield from ready(final=True)
+
+
+def _parse_rows(container, stream, parser, columns: dict):
+    """只拆包，从 slice header 读帧类型，产出 (帧类型, 时间, 包大小)；同时把各列记进 columns"""
+    bad = 0
+    for packet in container.demux(stream):
+        if packet.size == 0:
+            continue
+
+        try:
+            pict_type = parser(bytes(packet))
+        except ValueError:
+            pict_type = None
+            bad += 1
+        pts_time = float(packet.pts * stream.time_base) if packet.pts is not None else 0.0
+
+        columns["size"].append(packet.size)
+        columns["pts"].append(packet.pts or 0)
+        columns["key"].append(packet.is_keyframe)
+        columns["pict"].append(PICT_CODES.get(pict_type, 0))
+
+        yield pict_type, pts_time, packet.size
+
+    if bad:
+        print(f"[警告] {bad} 个包的 slice header 解析失败，帧类型记为未知", file=sys.stderr)
+
+
+def _index_rows(table: dict):
+    """从包索引回放 (帧类型, 时间, 包大小)，不拆包也不解码"""
+    times = packet_times(table).tolist()
+    picts = table["pict"].tolist()
+    sizes = table["size"].tolist()
+    for code, pts_time, size in zip(picts, times, sizes):
+        yield PICT_NAMES.get(code), pts_time, size
+
+
+def _frame_type(frame) -> str:
+    pt = frame.pict_type
+    return pt.name if hasattr(pt, "name") else _PICT_TYPE_MAP.get(int(pt), "NONE")
+
+
+def _decode_gop_types(stream, packets: list) -> list:
+    """跳读时的解码兜底：解码整个 GOP，按帧 pts 把类型对回各个包（不受 B 帧重排延迟影响）"""
+    codec = stream.codec_context
+    codec.flush_buffers()
+    types = {}
+    for packet in packets:
+        for frame in codec.decode(packet):
+            types[frame.pts] = _frame_type(frame)
+    for frame in codec.decode(None):
+        types[frame.pts] = _frame_type(frame)
+    return [types.get(packet.pts) for packet in packets]
+
+
+def _packet_index_lookup(video_path: str):
+    """
+    跳读时包在全文件中的序号：有包索引缓存或是 MP4（moov 样本表）时按 pts 查出，
+    否则返回 None，序号显示为 "-"
+    """
+    table = load_packet_index(video_path) or read_mp4_packet_table(video_path)
+    if table is None:
+        return None
+    order = np.argsort(table["pts"], kind="stable")
+    sorted_pts = np.asarray(table["pts"])[order]
+
+    def lookup(pts: int):
+        i = int(np.searchsorted(sorted_pts, pts))
+        return int(order[i]) if i < len(sorted_pts) and sorted_pts[i] == pts else "-"
+    return lookup
+
+
+def _seek_gops(container, stream, interval: float, parser, lookup):
+    """
+    跳读采样：从上一个采样 I 帧时间 + interval 处 seek 到前面的关键帧，
+    取第一个时间不早于采样点的 I 帧及其后直到下一个 I 帧的包，产出 (GOP 头, P/B 帧列表)
+    采样规则与顺序扫描相同，输出的 GOP 也相同
+    """
+    time_base = stream.time_base
+    target = 0.0
+    while True:
+        container.seek(int(target / time_base), stream=stream, backward=True, any_frame=False)
+        packets, types = [], []
+        for packet in container.demux(stream):
+            if packet.size == 0:
+                continue
+            pts_time = float(packet.pts * time_base) if packet.pts is not None else 0.0
+            if parser is not None:
+                try:
+                    pict_type = parser(bytes(packet))
+                except ValueError:
+                    pict_type = None
+                is_i = pict_type == "I"
+            else:
+                pict_type = None
+                is_i = packet.is_keyframe          # 不支持码流解析时以关键帧包为 GOP 边界
+            if not packets:
+                if is_i and pts_time >= target:
+                    packets.append(packet)
+                    types.append(pict_type)
+                continue
+            if is_i:
+                break
+            packets.append(packet)
+            types.append(pict_type)
+
+        if not packets:
+            return
+        if parser is None:
+            types = _decode_gop_types(stream, packets)
+
+        def index_of(packet):
+            return lookup(packet.pts) if lookup is not None else "-"
+
+        times = [float(p.pts * time_base) if p.pts is not None else 0.0 for p in packets]
+        header = (index_of(packets[0]), times[0], packets[0].size)
+        pb_frames = [
+            (t, index_of(p), pts_time, p.size)
+            for t, p, pts_time in zip(types[1:], packets[1:], times[1:])
+            if t in ("P", "B")
+        ]
+        yield header, pb_frames
+        target = times[0] + interval
+
+
+def frame_columns(table: dict) -> dict:
+    """包索引表 → 逐帧列；gop 为所属 GOP 编号（按 I 帧累计，第一个 I 帧之前的包为 -1）"""
+    picts = np.asarray(table["pict"], dtype=np.uint8)
+    return {
+        "index": np.arange(len(picts), dtype=np.int64),
+        "pts":   np.asarray(table["pts"], dtype=np.int64),
+        "time":  packet_times(table),
+        "type":  picts,
+        "size":  np.asarray(table["size"], dtype=np.int64),
+        "key":   np.asarray(table["key"], dtype=bool),
+        "gop":   np.cumsum(picts == PICT_CODES["I"], dtype=np.int64) - 1,
+    }
+
+
+def _group_percentiles(groups: np.ndarray, values: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """按组求分位数（线性插值，与 np.percentile 默认一致）；先按 (组, 值) 排序，再按各组偏移取数"""
+    if len(values) == 0:
+        return np.full(len(counts), np.nan)
+    ordered = values[np.lexsort((values, groups))].astype(np.float64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = starts + (counts - 1).clip(min=0) * (q / 100)
+    lo = np.floor(pos).astype(np.int64).clip(0, len(ordered) - 1)
+    hi = np.ceil(pos).astype(np.int64).clip(0, len(ordered) - 1)
+    result = ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+    return np.where(counts > 0, result, np.nan)
+
+
+def gop_aggregates(frames: dict) -> dict:
+    """由逐帧列计算每个 GOP 的汇总（bincount / lexsort，不逐 GOP 循环）"""
+    picts, sizes, gops = frames["type"], frames["size"], frames["gop"]
+    i_rows = np.flatnonzero(picts == PICT_CODES["I"])
+    n = len(i_rows)
+
+    is_p = (picts == PICT_CODES["P"]) & (gops >= 0)
+    is_b = (picts == PICT_CODES["B"]) & (gops >= 0)
+    pb = is_p | is_b
+
+    def total(mask):
+        return np.bincount(gops[mask], weights=sizes[mask], minlength=n).astype(np.int64)
+
+    pb_count = np.bincount(gops[pb], minlength=n)
+    result = {
+        "gop":         np.arange(n, dtype=np.int64),
+        "i_index":     frames["index"][i_rows],
+        "time":        frames["time"][i_rows],
+        "i_size":      sizes[i_rows],
+        "frames":      np.bincount(gops[gops >= 0], minlength=n),
+        "p_count":     np.bincount(gops[is_p], minlength=n),
+        "b_count":     np.bincount(gops[is_b], minlength=n),
+        "p_total":     total(is_p),
+        "b_total":     total(is_b),
+        "pb_total":    total(pb),
+    }
+    result["pb_mean"] = np.divide(result["pb_total"], pb_count,
+                                  out=np.full(n, np.nan), where=pb_count > 0)
+    for q in EXPORT_PERCENTILES:
+        result[f"pb_p{q}"] = _group_percentiles(gops[pb], sizes[pb], pb_count, q)
+    return result
+
+
+def export_columns(table: dict, out_path: str) -> tuple[int, int]:
+    """把帧表和 GOP 表按扩展名写出，返回 (帧数, GOP 数)"""
+    frames = frame_columns(table)
+    gops = gop_aggregates(frames)
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    ext = out.suffix.lower()
+
+    if ext == ".npz":
+        type_names = np.array([PICT_NAMES.get(code, "") for code in range(max(PICT_NAMES) + 1)])
+        np.savez_compressed(
+            out,
+            type_names=type_names,
+            **{f"frame_{k}": v for k, v in frames.items()},
+            **{f"gop_{k}": v for k, v in gops.items()},
+        )
+    else:
+        try:
+            import pandas as pd
+        except ImportError:
+            raise RuntimeError("导出 Parquet / Feather 需要 pandas 和 pyarrow：pip install pandas pyarrow")
+        frame_df = pd.DataFrame(frames)
+        frame_df["type"] = frame_df["type"].map(PICT_NAMES).astype("category")   # 未知类型为空值
+        gop_df = pd.DataFrame(gops)
+        gop_path = out.with_name(f"{out.stem}.gops{ext}")
+        if ext == ".parquet":
+            frame_df.to_parquet(out, index=False)
+            gop_df.to_parquet(gop_path, index=False)
+        else:
+            frame_df.to_feather(out)
+            gop_df.to_feather(gop_path)
+
+    return len(frames["index"]), len(gops["gop"])
+
+
+def analyze_and_print(video_path: str, interval: float = 1.0, use_cache: bool = True,
+                      force_decode: bool = False, seek: bool | None = None,
+                      export: str | None = None) -> None:
     gop_index = 0
     current_gop_header = None
     pb_frames = []
 
     with av.open(video_path) as container:
         stream = container.streams.video[0]
-        stream.codec_context.skip_frame = "DEFAULT"
 
         print_video_info(container, stream)
 
-        frame_index = 0
-        next_sample_pts = 0.0
-
-        for packet in container.demux(stream):
-            if packet.size == 0:
-                continue
-
-            pict_type = None
-            pts_time = float(packet.pts * stream.time_base) if packet.pts is not None else 0.0
-
-            for frame in packet.decode():
-                pt = frame.pict_type
-                pict_type = pt.name if hasattr(pt, "name") else _PICT_TYPE_MAP.get(int(pt), "NONE")
-                break
-
-            if pict_type is None:
-                frame_index += 1
-                continue
-
-            pkt_size = packet.size
-
-            if pict_type == "I":
-                if pts_time >= next_sample_pts:
-                    gop_index = flush_gop(gop_index, current_gop_header, pb_frames)
-                    current_gop_header = (frame_index, pts_time, pkt_size)
-                    pb_frames = []
-                    next_sample_pts = pts_time + interval
-                else:
-                    current_gop_header = None
-                    pb_frames = []
-            elif pict_type in ("P", "B") and current_gop_header is not None:
-                pb_frames.append((pict_type, frame_index, pts_time, pkt_size))
-
-            frame_index += 1
-
-        flush_gop(gop_index, current_gop_header, pb_frames)
-
+        # 有带帧类型的包索引缓存时直接回放；否则解析码流（不支持的编码才解码）并顺手写缓存
+        # --decode 是用来核对解析结果的，不读缓存
+        table = load_packet_index(video_path, need_pict=True) if use_cache and not force_decode else None
+        parser = None if force_decode else make_slice_type_parser(stream)
+
+        # 跳读采样：seek=None 时按间隔和缓存情况自动决定；导出需要全部帧，不跳读
+        if export:
+            seek = False
+        if seek is None:
+            seek = table is None and interval >= SEEK_MIN_INTERVAL
+        if seek:
+            print(f"跳读采样：每 {interval:g} 秒 seek 一次，只读一个 GOP\n")
+            lookup = _packet_index_lookup(video_path)
+            for header, pb_frames in _seek_gops(container, stream, interval, parser, lookup):
+                gop_index = flush_gop(gop_index, header, pb_frames)
+            print("-" * 55)
+            return
+
+        columns = {"size": [], "pts": [], "key": [], "pict": []}
+        if table is not None:
+            print(f"使用包索引缓存（{len(table['size'])} 个包）\n")
+            rows = _index_rows(table)
+        elif parser is not None:
+            rows = _parse_rows(container, stream, parser, columns)
+        else:
+            if force_decode:
+                print("已指定 --decode，逐包解码取帧类型\n")
+            else:
+                print(f"编码 {stream.codec_context.name} 不支持码流解析，逐包解码取帧类型\n")
+            rows = _decode_rows(container, stream, columns)
+
+        if export:
+            for _ in rows:                         # 只把各列收集完，不逐帧打印
+                pass
+        else:
+            next_sample_pts = 0.0
+
+            for frame_index, (pict_type, pts_time, pkt_size) in enumerate(rows):
+                if pict_type == "I":
+                    if pts_time >= next_sample_pts:
+                        gop_index = flush_gop(gop_index, current_gop_header, pb_frames)
+                        current_gop_header = (frame_index, pts_time, pkt_size)
+                        pb_frames = []
+                        next_sample_pts = pts_time + interval
+                    else:
+                        # 采样点之间的 I 帧：当前采样的 GOP 到此结束，先输出再丢弃后面的包
+                        gop_index = flush_gop(gop_index, current_gop_header, pb_frames)
+                        current_gop_header = None
+                        pb_frames = []
+                elif pict_type in ("P", "B") and current_gop_header is not None:
+                    pb_frames.append((pict_type, frame_index, pts_time, pkt_size))
+
+            flush_gop(gop_index, current_gop_header, pb_frames)
+
+        if table is None:
+            time_base = stream.time_base
+            table = make_table(
+                columns["size"], columns["pts"], columns["key"],
+                (time_base.numerator, time_base.denominator), picts=columns["pict"],
+            )
+            if use_cache:
+                try:
+                    save_packet_index(video_path, table)
+                except OSError as e:
+                    print(f"[警告] 包索引缓存写入失败：{e}", file=sys.stderr)
+
+    if export:
+        n_frames, n_gops = export_columns(table, export)
+        print(f"已导出 {n_frames} 帧 / {n_gops} 个 GOP → {export}")
+        return
     print("-" * 55)
 
 
@@ -144,19 +463,32 @@ def main():
     )
     parser.add_argument("--path", required=True, help="视频文件路径")
     parser.add_argument("--interval", type=float, default=1.0, help="关键帧采样间隔（秒），默认 1")
+    parser.add_argument("--no-cache", action="store_true", help="不读写包索引缓存，强制重新拆包")
+    parser.add_argument("--decode", action="store_true", help="不解析码流，逐包解码取帧类型（对照用）")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--seek", dest="seek", action="store_true", default=None,
+                      help=f"跳读采样：每个采样点 seek 过去只读一个 GOP（间隔 ≥ {SEEK_MIN_INTERVAL:g} 秒时默认开启）")
+    mode.add_argument("--scan", dest="seek", action="store_false", help="强制顺序扫描全部包")
+    parser.add_argument("--export", metavar="FILE",
+                        help="不逐帧打印，把逐帧列和 GOP 汇总导出到 .npz / .parquet / .feather（忽略 --interval）")
     args = parser.parse_args()
 
     if args.interval <= 0:
         print("错误: --interval 必须大于 0", file=sys.stderr)
         sys.exit(1)
 
+    if args.export and Path(args.export).suffix.lower() not in EXPORT_FORMATS:
+        print(f"错误: --export 只支持 {' / '.join(EXPORT_FORMATS)}", file=sys.stderr)
+        sys.exit(1)
+
     video_path = args.path
     if not Path(video_path).exists():
         print(f"错误: 文件不存在: {video_path}", file=sys.stderr)
         sys.exit(1)
 
     print(f"分析视频: {video_path}\n")
-    analyze_and_print(video_path, interval=args.interval)
+    analyze_and_print(video_path, interval=args.interval, use_cache=not args.no_cache,
+                      force_decode=args.decode, seek=args.seek, export=args.export)
 
 
 if __name__ == "__main__":
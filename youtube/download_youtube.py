@@ -1,9 +1,17 @@
 import yt_dlp
+import argparse
+import queue
+import re
 import sys
 import os
+import threading
+import time
 import tkinter as tk
 from tkinter import filedialog
 
+from info_cache import InfoCache, download_cached, extract_info_cached
+from url_list import COOKIES_PATH, expand_urls, read_url_file
+
 # 修复 Windows 下视频标题含 emoji 时的 GBK 编码错误
 if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
     try:
@@ -11,29 +19,45 @@ if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
     except Exception:
         pass
 
-def download_video(video_url):
-    download_dir = choose_download_dir("download")
-    if not os.path.exists(download_dir):
-        os.makedirs(download_dir)
+# 默认保存目录；批量 / 同步模式不弹窗，没给 -o 就用它
+DOWNLOAD_DIR = 'download'
 
-    # cookies 文件路径（与脚本同目录）
-    cookies_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'youtube_cookies.txt')
+# 批量模式：同时下载的视频数，以及单个视频内并发下载的分片数（DASH/HLS 分片流才生效）
+DOWNLOAD_WORKERS = 3
+FRAGMENT_THREADS = 4
 
+# 批量模式的文件名带上视频 ID，同一频道里重名的视频不会互相覆盖
+BATCH_OUTTMPL = '%(title)s [%(id)s].%(ext)s'
+_ID_IN_NAME = re.compile(r'\[([\w-]+)\]$')
+
+# 同步模式的下载存档（yt-dlp download_archive 格式），放在下载目录里
+ARCHIVE_NAME = 'download_archive.txt'
+
+def build_ydl_opts(download_dir, outtmpl='%(title)s.%(ext)s', fragment_threads=1):
     # 修改 format 为 bestvideo+bestaudio/best 以下载最高画质和音质
     # 如果系统没有安装 ffmpeg，bestvideo+bestaudio 会失败并回退到 best (最高画质但可能只有720p带音频的单文件)
-    ydl_opts = {
+    return {
         'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best',
         #'format': 'bestvideo+bestaudio/best',
-        'outtmpl': f'{download_dir}/%(title)s.%(ext)s',
+        'outtmpl': f'{download_dir}/{outtmpl}',
         'merge_output_format': 'mp4', # 尝试合并为mp4格式
-        'cookiefile': cookies_path,  # 使用 cookies 以支持年龄限制/会员视频等
+        'cookiefile': COOKIES_PATH,  # 使用 cookies 以支持年龄限制/会员视频等
+        'concurrent_fragment_downloads': fragment_threads,
     }
+
+def download_video(video_url):
+    download_dir = choose_download_dir(DOWNLOAD_DIR)
+    if not os.path.exists(download_dir):
+        os.makedirs(download_dir)
+
+    ydl_opts = build_ydl_opts(download_dir)
     
     print(f"正在获取视频信息: {video_url} ...")
+    cache = InfoCache()
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # 先仅获取信息，不下载
-            info = ydl.extract_info(video_url, download=False)
+            # 先仅获取信息，不下载；get_youtube_info.py 刚查过的视频直接读缓存，流地址过期才重新提取
+            info = extract_info_cached(ydl, video_url, cache, need_urls=True)
             
             title = info.get('title', '未知标题')
             duration = info.get('duration')
@@ -113,13 +137,15 @@ def download_video(video_url):
             input("请按回车键开始下载 (按 Ctrl+C 取消)...")
             
             print("\n开始下载...")
-            ydl.download([video_url])
+            download_cached(ydl, video_url, cache, info=info)
             print(f"\n下载完成！文件已保存到 {download_dir} 目录中。")
             
     except KeyboardInterrupt:
         print("\n\n已取消下载。")
     except Exception as e:
         print(f"\n错误: {e}")
+    finally:
+        cache.close()
 
 def choose_download_dir(default_dir):
     if os.name != 'nt':
@@ -138,10 +164,165 @@ def choose_download_dir(default_dir):
     except Exception:
         return default_dir
 
+def _download_worker(jobs, results, opts, stop):
+    # 每个工作线程持有自己的 YoutubeDL 实例和缓存连接，整个批次内复用
+    cache = InfoCache()
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        while not stop.is_set():
+            try:
+                idx, total, (ie_key, video_id, url, title) = jobs.get_nowait()
+            except queue.Empty:
+                break
+            print(f"[开始] [{idx}/{total}] {title}")
+            t0 = time.perf_counter()
+            try:
+                download_cached(ydl, url, cache)
+                print(f"[完成] [{idx}/{total}] {title} ({time.perf_counter() - t0:.1f}s)")
+                results.append((url, None))
+            except Exception as e:
+                print(f"[失败] [{idx}/{total}] {title}: {e}")
+                results.append((url, e))
+    cache.close()
+
+def _run_downloads(videos, download_dir, workers, fragment_threads, archive_path=None):
+    """由 workers 个线程并发下载 videos，返回每个已处理视频的 [(链接, 异常或 None)]"""
+    opts = build_ydl_opts(download_dir, BATCH_OUTTMPL, fragment_threads)
+    opts.update({'quiet': True, 'no_warnings': True, 'noprogress': True})
+    if archive_path:
+        # yt-dlp 下载成功后把「提取器 ID」追加进存档，多个实例写同一个文件时它自己加文件锁
+        opts['download_archive'] = archive_path
+
+    jobs = queue.Queue()
+    for idx, video in enumerate(videos, 1):
+        jobs.put((idx, len(videos), video))
+    results, stop = [], threading.Event()
+    threads = [
+        threading.Thread(target=_download_worker, args=(jobs, results, opts, stop), daemon=True)
+        for _ in range(max(min(workers, len(videos)), 1))
+    ]
+    for t in threads:
+        t.start()
+    try:
+        # 带超时轮询 join，Windows 下 Ctrl+C 才能打断主线程
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        print("\n\n已取消：不再开始新的下载，正在下载的视频随程序退出中断。")
+    return results
+
+def _print_summary(videos, results, failed, t0):
+    failed += [(url, e) for url, e in results if e is not None]
+    print("\n" + "=" * 40)
+    print(f"完成 {sum(e is None for _, e in results)} 个，失败 {len(failed)} 个，未开始 {len(videos) - len(results)} 个，"
+          f"总耗时 {time.perf_counter() - t0:.1f}s")
+    for url, e in failed:
+        print(f"  [失败] {url}: {e}")
+    return failed
+
+def download_batch(sources, download_dir, workers=DOWNLOAD_WORKERS, fragment_threads=FRAGMENT_THREADS):
+    """
+    非交互批量下载：sources 可以是视频 / 播放列表 / 频道链接，先展开成单个视频，
+    再由 workers 个线程同时下载，每个视频内部再用 fragment_threads 个线程并发下载分片。
+    返回失败的 [(链接, 异常)]。
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    videos, failed = expand_urls(sources)
+    print(f"共 {len(videos)} 个视频，{workers} 个并发下载，每个视频 {fragment_threads} 个分片线程，保存到 {download_dir}")
+    results = _run_downloads(videos, download_dir, workers, fragment_threads)
+    return _print_summary(videos, results, failed, t0)
+
+def archive_key(ie_key, video_id):
+    """yt-dlp download_archive 里的一行：小写提取器名 + 空格 + 视频 ID"""
+    return f"{(ie_key or 'generic').lower()} {video_id}"
+
+def load_archive(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+def index_downloaded_files(download_dir):
+    """
+    扫描目录里已下载的文件，返回 {视频 ID: 文件名}。
+    按 BATCH_OUTTMPL 文件名末尾的 [ID] 识别；.part / .ytdl 和合并前的 .f137.mp4 这类中间文件不算。
+    """
+    index = {}
+    for name in os.listdir(download_dir):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in ('.part', '.ytdl', '.temp', '.tmp'):
+            continue
+        match = _ID_IN_NAME.search(stem)
+        if match:
+            index.setdefault(match.group(1), name)
+    return index
+
+def sync_channel(sources, download_dir, workers=DOWNLOAD_WORKERS, fragment_threads=FRAGMENT_THREADS):
+    """
+    增量同步：平铺列出播放列表 / 频道里的视频 ID，和本地存档比对，只下载新视频。
+
+    本地状态放在下载目录里：
+      - ARCHIVE_NAME：yt-dlp 的 download_archive，下载成功后由 yt-dlp 自己追加
+      - 磁盘上的文件：按文件名里的 [ID] 建索引；存档之前就下载好的文件会被补记进存档
+    已存档的视频不再请求详情页，没有新视频时只花平铺列表的那几次请求。
+    返回失败的 [(链接, 异常)]。
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    archive_path = os.path.join(download_dir, ARCHIVE_NAME)
+    archived_ids = {key.split(' ', 1)[-1] for key in load_archive(archive_path)}
+    on_disk = index_downloaded_files(download_dir)
+
+    videos, failed = expand_urls(sources)
+    new, backfill = [], []
+    for video in videos:
+        ie_key, video_id = video[0], video[1]
+        if video_id is None:
+            new.append(video)
+        elif video_id in archived_ids:
+            continue
+        elif video_id in on_disk:
+            backfill.append(archive_key(ie_key, video_id))
+        else:
+            new.append(video)
+    if backfill:
+        with open(archive_path, 'a', encoding='utf-8') as f:
+            f.writelines(key + '\n' for key in backfill)
+
+    print(f"[同步] 列表共 {len(videos)} 个视频：已存档 {len(videos) - len(new) - len(backfill)} 个，"
+          f"磁盘已有补记存档 {len(backfill)} 个，新视频 {len(new)} 个（列表耗时 {time.perf_counter() - t0:.1f}s）")
+    results = _run_downloads(new, download_dir, workers, fragment_threads, archive_path) if new else []
+    return _print_summary(new, results, failed, t0)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="下载 YouTube 视频；多个链接、播放列表 / 频道或链接列表文件走批量模式")
+    parser.add_argument("urls", nargs="*", help="视频 / 播放列表 / 频道链接")
+    parser.add_argument("-f", "--file", help="链接列表文件，一行一个")
+    parser.add_argument("--batch", action="store_true", help="批量模式（不逐个确认，播放列表 / 频道展开后并发下载）")
+    parser.add_argument("--sync", action="store_true", help=f"增量同步：按下载目录里的 {ARCHIVE_NAME} 和已有文件跳过已下载的视频")
+    parser.add_argument("-o", "--output", default=None, help=f"保存目录，默认 {DOWNLOAD_DIR}（单个视频时 Windows 下弹窗选择）")
+    parser.add_argument("-j", "--jobs", type=int, default=DOWNLOAD_WORKERS, help=f"同时下载的视频数，默认 {DOWNLOAD_WORKERS}")
+    parser.add_argument("--fragments", type=int, default=FRAGMENT_THREADS, help=f"单个视频的并发分片数，默认 {FRAGMENT_THREADS}")
+    args = parser.parse_args()
+
+    sources = list(args.urls)
+    if args.file:
+        sources += read_url_file(args.file)
+
+    if args.sync or args.batch or args.file or len(sources) > 1:
+        if not sources:
+            print("未输入有效链接，程序退出。")
+            sys.exit(1)
+        download_dir = args.output or DOWNLOAD_DIR
+        run = sync_channel if args.sync else download_batch
+        failed = run(sources, download_dir, max(args.jobs, 1), max(args.fragments, 1))
+        sys.exit(1 if failed else 0)
+
     # 如果通过命令行参数提供了URL，则使用该参数，否则提示用户输入
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
+    if sources:
+        url = sources[0]
     else:
         url = input("请输入YouTube视频链接: ").strip()
         
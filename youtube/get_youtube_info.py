@@ -1,5 +1,25 @@
 import yt_dlp
+import argparse
+import csv
+import json
+import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from info_cache import InfoCache, extract_info_cached
+from url_list import expand_urls, read_url_file
+
+# 批量报告模式：同时提取信息的线程数
+REPORT_WORKERS = 8
+
+# 报告的列（CSV 表头 / Markdown 表头 / JSON 字段），顺序即输出顺序
+REPORT_FIELDS = [
+    'url', 'id', 'title', 'duration', 'resolution', 'fps', 'vcodec', 'vbr', 'acodec', 'abr', 'asr',
+    'tbr', 'est_size_mb', 'seconds', 'error',
+]
+REPORT_FORMATS = ('csv', 'json', 'md')
 
 def get_video_info(video_url):
     # 使用 bestvideo+bestaudio 组合来模拟获取最高质量音视频流的参数
@@ -10,10 +30,11 @@ def get_video_info(video_url):
     }
     
     print(f"正在获取视频信息: {video_url} ...")
+    cache = InfoCache()
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # 仅获取信息，不下载
-            info = ydl.extract_info(video_url, download=False)
+            # 仅获取信息，不下载；结果写入缓存，接着用 download_youtube.py 下载时不用再提取一次
+            info = extract_info_cached(ydl, video_url, cache)
             
             title = info.get('title', '未知标题')
             duration = info.get('duration')
@@ -74,11 +95,171 @@ def get_video_info(video_url):
         print("\n\n已取消获取。")
     except Exception as e:
         print(f"\n获取信息时发生错误: {e}")
+    finally:
+        cache.close()
+
+def summarize_info(info):
+    """把信息字典压成报告里的一行（取值和 get_video_info 打印的一致，缺失的留 None）"""
+    formats = info.get('requested_formats')
+    if formats:
+        v_format = formats[0]
+        a_format = formats[1] if len(formats) > 1 else formats[0]
+    else:
+        v_format = info
+        a_format = info
+
+    width, height = v_format.get('width'), v_format.get('height')
+    if width and height:
+        resolution = f"{width}x{height}"
+    elif height:
+        resolution = f"{height}p"
+    else:
+        resolution = None
+
+    # 预估大小：每路流优先用 filesize / filesize_approx，都没有时按该流码率 × 时长估算
+    duration = info.get('duration')
+    size = 0
+    for f in formats or [info]:
+        size += f.get('filesize') or f.get('filesize_approx') or (f.get('tbr') or 0) * 1000 / 8 * (duration or 0)
+    tbr = info.get('tbr') or sum((f.get('tbr') or 0) for f in (formats or [info])) or None
+
+    return {
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'duration': duration,
+        'resolution': resolution,
+        'fps': v_format.get('fps'),
+        'vcodec': v_format.get('vcodec'),
+        'vbr': v_format.get('vbr'),
+        'acodec': a_format.get('acodec'),
+        'abr': a_format.get('abr'),
+        'asr': a_format.get('asr'),
+        'tbr': round(tbr, 1) if tbr else None,
+        'est_size_mb': round(size / (1024 * 1024), 2) if size else None,
+    }
+
+def expand_sources(sources):
+    """播放列表 / 频道展开成单个视频链接（平铺提取，只拿 ID）；单视频链接原样保留"""
+    videos, failed = expand_urls(sources)
+    return [url for _, _, url, _ in videos], failed
+
+def collect_report(urls, workers=REPORT_WORKERS):
+    """
+    用 workers 个线程并发提取信息，返回按输入顺序排列的报告行。
+    每个线程持有自己的 YoutubeDL 实例和缓存连接；seconds 是这条链接提取（或读缓存）的耗时。
+    """
+    ydl_opts = {
+        'format': 'bestvideo+bestaudio/best',
+        'quiet': True,
+        'no_warnings': True,
+    }
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+
+    def work(url):
+        if not hasattr(local, 'ydl'):
+            local.ydl = yt_dlp.YoutubeDL(ydl_opts)
+            local.cache = InfoCache()
+            with opened_lock:
+                opened.append((local.ydl, local.cache))
+        t0 = time.perf_counter()
+        try:
+            row = summarize_info(extract_info_cached(local.ydl, url, local.cache))
+            row['error'] = None
+        except Exception as e:
+            row = {'error': str(e)}
+        row.update(url=url, seconds=round(time.perf_counter() - t0, 3))
+        return row
+
+    rows = [None] * len(urls)
+    try:
+        with ThreadPoolExecutor(max_workers=max(min(workers, len(urls)), 1)) as pool:
+            futures = {pool.submit(work, url): i for i, url in enumerate(urls)}
+            for done, future in enumerate(as_completed(futures), 1):
+                row = future.result()
+                rows[futures[future]] = row
+                status = f"[失败] {row['error']}" if row['error'] else row['title']
+                print(f"[{done}/{len(urls)}] {row['seconds']:6.2f}s  {status}")
+    finally:
+        for ydl, cache in opened:
+            ydl.close()
+            cache.close()
+    return [{field: row.get(field) for field in REPORT_FIELDS} for row in rows]
+
+def _markdown_cell(value):
+    return '' if value is None else str(value).replace('|', '\\|').replace('\n', ' ')
+
+def write_report(rows, path, fmt):
+    """写出报告；fmt 为 csv / json / md，path 为 None 时输出到屏幕"""
+    out = open(path, 'w', encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='') if path else sys.stdout
+    try:
+        if fmt == 'csv':
+            writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        elif fmt == 'json':
+            json.dump(rows, out, ensure_ascii=False, indent=2)
+            out.write('\n')
+        else:
+            out.write('| ' + ' | '.join(REPORT_FIELDS) + ' |\n')
+            out.write('|' + '---|' * len(REPORT_FIELDS) + '\n')
+            for row in rows:
+                out.write('| ' + ' | '.join(_markdown_cell(row[field]) for field in REPORT_FIELDS) + ' |\n')
+    finally:
+        if path:
+            out.close()
+
+def print_timing(rows, wall):
+    """提取耗时汇总：总耗时 vs 各链接耗时之和（看并发收益），以及最慢的几条"""
+    total = sum(row['seconds'] for row in rows if row['seconds'] is not None)
+    failed = sum(1 for row in rows if row['error'])
+    print("\n" + "=" * 40)
+    print(f"共 {len(rows)} 个视频，失败 {failed} 个；总耗时 {wall:.1f}s，各链接提取耗时合计 {total:.1f}s")
+    for row in sorted((r for r in rows if r['seconds'] is not None), key=lambda r: r['seconds'], reverse=True)[:5]:
+        print(f"  {row['seconds']:6.2f}s  {row['url']}")
+
+def bulk_report(sources, path=None, fmt=None, workers=REPORT_WORKERS):
+    """批量报告：展开播放列表 / 频道，并发提取每个视频的参数，写成一张 CSV / JSON / Markdown 表"""
+    t0 = time.perf_counter()
+    urls, failed = expand_sources(sources)
+    print(f"共 {len(urls)} 个视频，{workers} 个线程并发提取...")
+    rows = collect_report(urls, workers)
+    rows += [{**dict.fromkeys(REPORT_FIELDS), 'url': url, 'error': str(e)} for url, e in failed]
+
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower().lstrip('.') if path else ''
+        fmt = {'markdown': 'md'}.get(ext, ext) if ext in REPORT_FORMATS + ('markdown',) else 'md'
+    write_report(rows, path, fmt)
+    if path:
+        print(f"报告已写入 {path}")
+    print_timing(rows, time.perf_counter() - t0)
+    return rows
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看 YouTube 视频的音视频参数；多个链接、播放列表或链接列表文件生成批量报告")
+    parser.add_argument("urls", nargs="*", help="视频 / 播放列表 / 频道链接")
+    parser.add_argument("-f", "--file", help="链接列表文件，一行一个")
+    parser.add_argument("--report", nargs="?", const="", default=None,
+                        help="批量报告模式；可跟输出文件路径（按扩展名 .csv / .json / .md 决定格式），不跟则输出到屏幕")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default=None, help="报告格式，默认按输出文件扩展名，否则 md")
+    parser.add_argument("-j", "--jobs", type=int, default=REPORT_WORKERS, help=f"并发提取线程数，默认 {REPORT_WORKERS}")
+    args = parser.parse_args()
+
+    sources = list(args.urls)
+    if args.file:
+        sources += read_url_file(args.file)
+
+    if args.report is not None or args.file or len(sources) > 1:
+        if not sources:
+            print("未输入有效链接，程序退出。")
+            sys.exit(1)
+        rows = bulk_report(sources, args.report or None, args.format, max(args.jobs, 1))
+        sys.exit(1 if any(row['error'] for row in rows) else 0)
+
     # 如果通过命令行参数提供了URL，则使用该参数，否则提示用户输入
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
+    if sources:
+        url = sources[0]
     else:
         try:
             url = input("请输入YouTube视频链接: ").strip()
@@ -0,0 +1,168 @@
+"""
+yt-dlp 视频信息缓存
+extract_info 是查看 / 下载里最慢、网络往返最多的一步；先用 get_youtube_info.py 看参数再用 download_youtube.py 下载时，
+同一个视频会被完整提取两次。这里把 sanitize_info 之后的信息字典按「提取器 + 视频 ID」存进 SQLite，
+两个脚本先查缓存，没命中或过期才真正提取。
+
+有效期分两种：
+  - 元数据：INFO_TTL 秒，只看参数（标题 / 编码 / 码率）时用这个
+  - 流地址：YouTube 的直链带 expire 参数，几小时后失效；要下载时取两者较早的那个，过期就重新提取
+
+缓存是一个 SQLite 文件（默认 temp/info_cache.sqlite），表结构：
+  info(key, info, created, url_expire)   主键 key = "提取器 视频ID"，info 为 JSON
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+import urllib.parse
+
+import yt_dlp
+from yt_dlp.utils import DownloadError
+
+# ── 配置 ──────────────────────────────────────────────────────────────────────
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp", "info_cache.sqlite")
+
+# 元数据有效期（秒）
+INFO_TTL = 24 * 3600
+
+# 流地址离过期不到这么多秒就当作已过期，留出下载本身的时间
+URL_EXPIRE_MARGIN = 30 * 60
+
+# 用缓存信息下载失败时，只有这些 HTTP 状态说明是流地址失效，值得重新提取再试
+STALE_URL_STATUS = (403, 410)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def match_extractor(url):
+    """按 yt-dlp 自己的匹配顺序找到第一个能处理该链接的提取器"""
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.suitable(url):
+            return ie
+    return None
+
+
+def cache_key(url):
+    """不发请求，直接从链接算出缓存键「提取器 视频ID」；播放列表等解析不出单个视频 ID 的返回 None"""
+    ie = match_extractor(url)
+    if ie is None or getattr(ie, '_RETURN_TYPE', None) != 'video':
+        return None
+    video_id = ie.get_temp_id(url)
+    return f"{ie.ie_key().lower()} {video_id}" if video_id else None
+
+
+def _url_expire(url):
+    # googlevideo 直链是 ?expire=1700000000，DASH / HLS 清单地址是 /expire/1700000000/
+    parsed = urllib.parse.urlparse(url)
+    values = urllib.parse.parse_qs(parsed.query).get('expire')
+    if not values and '/expire/' in parsed.path:
+        values = [parsed.path.split('/expire/', 1)[1].split('/', 1)[0]]
+    try:
+        return float(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+def stream_expire(info):
+    """信息字典里的流地址最早什么时候过期，看不出来返回 None（所有格式一起算，不管最后选中哪个）"""
+    formats = info.get('formats') or [info]
+    expires = [e for e in (_url_expire(f.get('url') or '') for f in formats) if e is not None]
+    return min(expires) if expires else None
+
+
+class InfoCache:
+    """SQLite 视频信息缓存；每个线程各开一个，用完可以由别的线程统一关闭"""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = INFO_TTL):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS info ("
+            " key TEXT PRIMARY KEY, info TEXT NOT NULL, created REAL NOT NULL, url_expire REAL)"
+        )
+
+    def get(self, key: str, need_urls: bool = False):
+        """查询缓存，过期或没命中返回 None；need_urls=True 时流地址快过期也算过期"""
+        row = self.conn.execute("SELECT info, created, url_expire FROM info WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        info, created, url_expire = row
+        now = time.time()
+        if now - created > self.ttl:
+            return None
+        if need_urls and url_expire is not None and now + URL_EXPIRE_MARGIN > url_expire:
+            return None
+        return json.loads(info)
+
+    def put(self, key: str, info: dict) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO info (key, info, created, url_expire) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(info, ensure_ascii=False), time.time(), stream_expire(info)),
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def extract_info_cached(ydl, url, cache=None, need_urls=False):
+    """
+    带缓存的 ydl.extract_info(url, download=False)。
+
+    命中时用当前 ydl 的 format 设置重新选一次格式（只在本地算，不发请求），
+    所以查看和下载两边 format 写法不同也能共用同一条缓存。
+    """
+    key = cache_key(url) if cache is not None else None
+    if key is not None:
+        info = cache.get(key, need_urls)
+        if info is not None:
+            return ydl.process_ie_result(info, download=False)
+
+    info = ydl.extract_info(url, download=False)
+    if key is not None and info.get('_type', 'video') == 'video':
+        cache.put(key, ydl.sanitize_info(info, remove_private_keys=True))
+    return info
+
+
+def _is_stale_url_error(error, info):
+    """下载失败是不是因为流地址失效：已过 expire 时间，或错误链里有 403 / 410"""
+    expire = stream_expire(info)
+    if expire is not None and time.time() >= expire:
+        return True
+    exc = error.exc_info[1] if getattr(error, 'exc_info', None) else None
+    while exc is not None:
+        status = getattr(exc, 'status', None) or getattr(exc, 'code', None)
+        if status in STALE_URL_STATUS:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    # 分片下载器只报错误文本，不带异常对象
+    return re.search(r'HTTP Error (%s)\b' % '|'.join(map(str, STALE_URL_STATUS)), str(error)) is not None
+
+
+def download_cached(ydl, url, cache=None, info=None):
+    """
+    下载单个视频，优先用缓存里的信息字典（info 可直接传入已取到的），省掉一次完整提取。
+    缓存的流地址若在下载时已失效（过了 expire 或 403 / 410），重新提取、刷新缓存后再下一次；
+    其它错误（磁盘满、ffmpeg 合并失败、地区限制等）重新提取也没用，原样抛出。
+    """
+    if info is None and cache is not None:
+        key = cache_key(url)
+        info = cache.get(key, need_urls=True) if key is not None else None
+    if info is not None:
+        try:
+            # 和 yt-dlp 的 --load-info-json 一样先清掉上次选格式留下的字段，再按当前设置处理并下载
+            ydl.process_ie_result(ydl.sanitize_info(info, remove_private_keys=True), download=True)
+            return
+        except DownloadError as e:
+            if not _is_stale_url_error(e, info):
+                raise
+            ydl.report_warning(f'缓存的流地址已失效（{e}），重新提取信息')
+
+    info = ydl.extract_info(url, download=True)
+    key = cache_key(url) if cache is not None else None
+    if key is not None and info.get('_type', 'video') == 'video':
+        cache.put(key, ydl.sanitize_info(info, remove_private_keys=True))
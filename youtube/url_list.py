@@ -0,0 +1,109 @@
+"""
+链接列表展开，download_youtube.py（批量下载 / 同步频道）和 get_youtube_info.py（批量报告）共用。
+这里只依赖 yt-dlp，不引入 tkinter、也不改 stdout，查看信息的脚本导入它没有副作用。
+"""
+
+import os
+
+import yt_dlp
+
+from info_cache import match_extractor
+
+# ── 配置 ──────────────────────────────────────────────────────────────────────
+# cookies 文件路径（与脚本同目录）
+COOKIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'youtube_cookies.txt')
+
+# 播放列表嵌套展开的最大层数（频道 → 标签页 → 视频 只需要两层）
+MAX_PLAYLIST_DEPTH = 2
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def read_url_file(path):
+    """读取链接列表文件：一行一个链接，空行和 # 开头的行忽略"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def _is_video_entry(entry):
+    """平铺条目是不是单个视频：看它的提取器声明的返回类型，声明为 video 才算"""
+    ie_key = entry.get('ie_key')
+    ie = yt_dlp.extractor.get_info_extractor(ie_key) if ie_key else match_extractor(entry.get('url') or '')
+    return ie is not None and getattr(ie, '_RETURN_TYPE', None) == 'video'
+
+
+def _flatten_entries(ydl, info, skipped, depth=0):
+    """
+    逐个产出播放列表里的视频条目；嵌套的列表 / 频道标签页（如 YoutubeTab）再展开一层，
+    返回类型不确定的条目（如 generic）平铺提取一次看它到底是视频还是列表。
+    超过 MAX_PLAYLIST_DEPTH 层还不是视频的条目、展开出错的条目（如频道没有 Shorts / 直播标签页）不下载，
+    (链接, 原因) 记进 skipped，不影响同一列表里的其它条目
+    """
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('entries') is not None:
+            yield from _flatten_entries(ydl, entry, skipped, depth + 1)
+        elif entry.get('_type', 'video') == 'video' or _is_video_entry(entry):
+            yield entry
+        elif depth >= MAX_PLAYLIST_DEPTH:
+            skipped.append((entry.get('url') or entry.get('webpage_url'), f"嵌套超过 {MAX_PLAYLIST_DEPTH} 层的列表"))
+        else:
+            # 频道首页展开出来的是「视频 / Shorts / 直播」等标签页，再展开一层
+            try:
+                resolved = ydl.extract_info(entry['url'], download=False)
+            except Exception as e:
+                skipped.append((entry['url'], f"展开失败: {e}"))
+                continue
+            if resolved.get('_type') == 'playlist':
+                yield from _flatten_entries(ydl, resolved, skipped, depth + 1)
+            else:
+                yield {'ie_key': resolved.get('extractor_key'), 'id': resolved.get('id'),
+                       'url': resolved.get('webpage_url') or entry['url'], 'title': resolved.get('title')}
+
+
+def expand_urls(sources):
+    """
+    把视频 / 播放列表 / 频道链接展开成单个视频，按 ID 去重。
+    返回 (视频列表 [(提取器, 视频 ID, 链接, 标题)], 展开失败的 [(链接, 异常)])。
+
+    播放列表和频道只做平铺提取（extract_flat），每个视频只拿到 ID 和链接，
+    不逐个请求详情页；单视频链接的 ID 直接从链接里解析，不发请求。完整信息留给下载线程各自获取。
+    """
+    opts = {
+        'extract_flat': 'in_playlist',
+        'quiet': True,
+        'no_warnings': True,
+        'cookiefile': COOKIES_PATH,
+    }
+    videos, failed, seen = [], [], set()
+
+    def add(ie_key, video_id, url, title):
+        key = video_id or url
+        if key not in seen:
+            seen.add(key)
+            videos.append((ie_key, video_id, url, title))
+
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        for url in sources:
+            ie = match_extractor(url)
+            if ie is not None and getattr(ie, '_RETURN_TYPE', None) == 'video':
+                add(ie.ie_key(), ie.get_temp_id(url), url, url)
+                continue
+            try:
+                info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                print(f"[失败] 展开 {url}: {e}")
+                failed.append((url, e))
+                continue
+            if info.get('_type') != 'playlist':
+                add(info.get('extractor_key'), info.get('id'), info.get('webpage_url') or url, info.get('title') or url)
+                continue
+            count, skipped = 0, []
+            for entry in _flatten_entries(ydl, info, skipped):
+                add(entry.get('ie_key'), entry.get('id'), entry.get('url') or entry.get('webpage_url'),
+                    entry.get('title') or entry.get('id'))
+                count += 1
+            print(f"[列表] {info.get('title') or url}: {count} 个视频")
+            for nested, reason in skipped:
+                print(f"  [跳过] {nested}: {reason}")
+    return videos, failed